@@ -3,7 +3,11 @@ from typing import Callable
 import numpy as np
 from ioh import ProblemClass, get_problem, logger, ProblemType
 
+import feast.problems as problems
+from feast.cache import EvaluationCache, EvaluationContext, SqliteEvaluationCache
 from metaheuristics.base import Heuristic
+from metaheuristics.lockstep import LockstepTwoRateEa
+from metaheuristics.observables import ObservablesSchema
 from metaheuristics.tworate import TwoRateEa
 import os
 from feast.grammar import Grammar
@@ -18,12 +22,14 @@ parameters = {
     'PROBLEM_CLASS': ProblemClass.PBO,
 
     'INNER_BUDGET': 5000,
+    'MUTATION_KERNEL': 'python',  # 'numpy' is faster from a few dozen bits on
     'OUTER_BUDGET': 500,
     'OUTER_TRIALS': 5,
     'BENCHMARK_RUNS': 10
 }
 
 parameters['CHILD_POP_SIZE'] = parameters['DIMENSION']
+parameters['EVALUATION_CACHE'] = parameters['OUTPUT_DIR'] + 'evaluations.sqlite'
 
 
 def get_fresh_problem():
@@ -35,6 +41,15 @@ def get_fresh_problem():
     )
 
 
+def get_native_problem():
+    # Same problem without ioh's overhead, for the search phase; benchmark on get_fresh_problem()
+    return problems.get_problem(
+        parameters['PROBLEM_TYPE'],
+        parameters['INSTANCE_ID'],
+        parameters['DIMENSION']
+    )
+
+
 def get_fresh_inner_heuristic(problem: ProblemType, injection):
     heuristic = TwoRateEa(parameters['CHILD_POP_SIZE'])
     heuristic.configure(
@@ -44,17 +59,28 @@ def get_fresh_inner_heuristic(problem: ProblemType, injection):
     )
 
 
-def build_two_rate_ea(problem: ProblemType, individual_evaluate) -> Heuristic:
-    heuristic = TwoRateEa(parameters['CHILD_POP_SIZE'])
+def build_two_rate_ea(problem: ProblemType, individual_evaluate, budget: int = None) -> Heuristic:
+    heuristic = TwoRateEa(parameters['CHILD_POP_SIZE'], parameters['MUTATION_KERNEL'])
     heuristic.configure(
         problem,
-        parameters['INNER_BUDGET'],
+        parameters['INNER_BUDGET'] if budget is None else budget,
         {'adaptation': individual_evaluate}
     )
     heuristic.initialize_population()
     return heuristic
 
 
+def build_lockstep_two_rate_ea(problem: ProblemType, batch_evaluate, runs: int, budget: int = None) -> Heuristic:
+    heuristic = LockstepTwoRateEa(parameters['CHILD_POP_SIZE'], runs)
+    heuristic.configure(
+        problem,
+        parameters['INNER_BUDGET'] if budget is None else budget,
+        {'adaptation': batch_evaluate}
+    )
+    heuristic.initialize_population()
+    return heuristic
+
+
 def get_logger(experiment_name, algorithm_name):
     l = logger.Analyzer(
         root=os.getcwd(),  # Store data in the current working directory
@@ -65,24 +91,49 @@ def get_logger(experiment_name, algorithm_name):
     return l
 
 
+def get_evaluation_cache() -> EvaluationCache:
+    return SqliteEvaluationCache(parameters['EVALUATION_CACHE'])
+
+
+def get_evaluation_context(problem: ProblemType) -> EvaluationContext:
+    return EvaluationContext.from_problem(problem, parameters['INNER_BUDGET'], parameters['CHILD_POP_SIZE'])
+
+
+def get_observables_schema() -> ObservablesSchema:
+    return TwoRateEa.observables_schema
+
+
 def get_grammar():
     return Grammar()
 
 
-def benchmark(metaheuristic_builder: Callable, problem: ProblemType, solution: Callable):
+def benchmark(metaheuristic_builder: Callable, problem: ProblemType, solution: Callable, lockstep: bool = False):
+    # With lockstep, all runs advance together: metaheuristic_builder builds a lockstep heuristic like
+    # build_lockstep_two_rate_ea and solution evaluates arrays of observables, like Tree.evaluate_batch.
+    # Benchmark runs are never taken from an evaluation cache, since the logger attached to the problem should
+    # see all of them.
     performance = []
-    for i in range(parameters['BENCHMARK_RUNS']):
-        inner_heuristic = metaheuristic_builder(problem, solution)
-        y_best, x_best, problem = inner_heuristic.run()
+    if lockstep:
+        inner_heuristic = metaheuristic_builder(problem, solution, parameters['BENCHMARK_RUNS'])
+        y_best, x_best, evaluations = inner_heuristic.run()
+        for i in range(parameters['BENCHMARK_RUNS']):
+            leftover_ratio = (inner_heuristic.budget - evaluations[i]) / inner_heuristic.budget
+            performance.append(y_best[i] + leftover_ratio)
+            print(f"result: {y_best[i]} as {x_best[i].tolist()} using {evaluations[i]} evaluations")
+        problem.reset()
+    else:
+        for i in range(parameters['BENCHMARK_RUNS']):
+            inner_heuristic = metaheuristic_builder(problem, solution)
+            y_best, x_best, problem = inner_heuristic.run()
 
-        leftover_budget = inner_heuristic.budget - problem.state.evaluations
-        leftover_ratio = leftover_budget / inner_heuristic.budget
-        score = y_best + leftover_ratio  # leftover budget ratio is a tiebreaker
+            leftover_budget = inner_heuristic.budget - problem.state.evaluations
+            leftover_ratio = leftover_budget / inner_heuristic.budget
+            score = y_best + leftover_ratio  # leftover budget ratio is a tiebreaker
 
-        performance.append(score)
+            performance.append(score)
 
-        print(f"result: {y_best} as {x_best} using {problem.state.evaluations} evaluations")
-        problem.reset()
+            print(f"result: {y_best} as {x_best} using {problem.state.evaluations} evaluations")
+            problem.reset()
 
     print(f"Aggregate score: {np.mean(performance)}")
 
@@ -14,4 +14,4 @@ problem = common.get_fresh_problem()
 logger = common.get_logger(EXPERIMENT_NAME, ALGORITHM_NAME)
 problem.attach_logger(logger)
 
-common.benchmark(common.build_two_rate_ea, problem, root.evaluate)
+common.benchmark(common.build_two_rate_ea, problem, tree.compile(root))
@@ -6,15 +6,19 @@ EXPERIMENT_NAME = common.parameters['OUTPUT_DIR'] + 'experiment_03'
 ALGORITHM_NAME = 'random-search-1+1'
 
 problem = common.get_fresh_problem()
+search_problem = common.get_native_problem()
 
 random_search = RandomSearch(
     grammar=common.get_grammar(),
     starting_symbol='NUM',
-    problem=problem,
+    problem=search_problem,
     build_inner_heuristic=common.build_two_rate_ea,
     outer_budget=common.parameters['OUTER_BUDGET'],
     trials_per_evaluation=common.parameters['OUTER_TRIALS'],
     must_observe=['numeric_nullary_observable:rate'],
+    evaluation_cache=common.get_evaluation_cache(),
+    evaluation_context=common.get_evaluation_context(search_problem),
+    observables_schema=common.get_observables_schema(),
     cache_phenotype_evaluations=True,
     soft_limit=5
 )
@@ -28,4 +32,4 @@ print(f"Best Formula: {root.formula}")
 logger = common.get_logger(EXPERIMENT_NAME, ALGORITHM_NAME)
 problem.attach_logger(logger)
 
-common.benchmark(common.build_two_rate_ea, problem, root.evaluate)
+common.benchmark(common.build_two_rate_ea, problem, root.compile(common.get_observables_schema()))
@@ -6,11 +6,12 @@ EXPERIMENT_NAME = common.parameters['OUTPUT_DIR'] + 'experiment_05'
 ALGORITHM_NAME = 'topiary'
 
 problem = common.get_fresh_problem()
+search_problem = common.get_native_problem()
 
 topiary = Topiary(
     grammar=common.get_grammar(),
     starting_symbol='NUM',
-    problem=problem,
+    problem=search_problem,
     build_inner_heuristic=common.build_two_rate_ea,
     outer_budget=common.parameters['OUTER_BUDGET'],
     trials_per_evaluation=common.parameters['OUTER_TRIALS'],
@@ -20,6 +21,9 @@ topiary = Topiary(
     survival='plus',
     cache_phenotype_evaluations=True,
     must_observe=['numeric_nullary_observable:rate'],
+    evaluation_cache=common.get_evaluation_cache(),
+    evaluation_context=common.get_evaluation_context(search_problem),
+    observables_schema=common.get_observables_schema(),
     # random_seed=0
 )
 topiary.initialize_population()
@@ -37,4 +41,4 @@ print(f"Best Formula: {root.formula}")
 logger = common.get_logger(EXPERIMENT_NAME, ALGORITHM_NAME)
 problem.attach_logger(logger)
 
-common.benchmark(common.build_two_rate_ea, problem, root.evaluate)
\ No newline at end of file
+common.benchmark(common.build_two_rate_ea, problem, root.compile(common.get_observables_schema()))
\ No newline at end of file
@@ -0,0 +1,22 @@
+Feature: Evaluation caches shared across runs
+
+  Scenario Outline: trial scores are stored under the full evaluation key
+    Given an empty <backend> evaluation cache
+    When we store the scores 14.5, 15.0 for numeric_nullary_observable:rate with 2 trials
+    Then the cache has the scores 14.5, 15.0 for numeric_nullary_observable:rate with 2 trials
+    And the cache has no scores for numeric_nullary_observable:rate with 3 trials
+    And the cache has no scores for numeric_nullary_observable:dimension with 2 trials
+    And the cache has no scores for numeric_nullary_observable:rate with 2 trials of scores version 0
+    Examples:
+      | backend |
+      | memory  |
+      | sqlite  |
+
+  Scenario: an sqlite cache can be shared with other processes
+    Given an empty sqlite evaluation cache
+    When another process stores the scores 1.0, 2.0 for numeric_nullary_observable:rate with 2 trials
+    Then the cache has the scores 1.0, 2.0 for numeric_nullary_observable:rate with 2 trials
+
+  Scenario: evaluations taken from the cache count against the outer budget
+    When two GE searches with the same seed initialize their population, sharing an evaluation cache
+    Then both searches used 5 evaluations, and the second one took all of them from the cache
@@ -0,0 +1,29 @@
+Feature: Successive halving of candidate evaluations
+
+  Scenario: geometric rungs end in the full evaluation
+    Given successive halving over 3 rungs with eta 3, an inner budget of 5000 and 5 trials
+    Then the rungs are (556, 1), (1667, 1), (5000, 5)
+
+  Scenario: candidates move up when they are in the top third of their rung so far
+    Given successive halving over 3 rungs with eta 3, an inner budget of 5000 and 5 trials
+    When the scores 14.0 are seen on rung 0
+    Then the promotions are true
+    When the scores 13.0, 15.0, 12.0, 11.0, 10.0 are seen on rung 0
+    Then the promotions are false, true, false, false, false
+    When the scores 14.5, 16.0 are seen on rung 0
+    Then the promotions are false, true
+
+  Scenario: candidates rejected on a lower rung rank last, and only full evaluations are cached
+    Given a GE search on the native PBO problem 1 of dimension 8 with successive halving over 2 rungs, caching phenotypes and behavioural signatures
+    When we initialize the population and evaluate 9 children
+    Then the initial population was evaluated on the last rung only
+    And the children used 2 evaluations, and 1 of them were rejected before the last rung
+    And only the fitness of fully evaluated phenotypes is cached
+
+  Scenario: successive halving needs plus survival
+    When we build a GE search with comma survival and successive halving
+    Then a ValueError is raised
+
+  Scenario: the last rung runs the inner budget the evaluation cache is keyed on
+    When we build a GE search with plus survival and successive halving and an evaluation cache of another inner budget
+    Then a ValueError is raised
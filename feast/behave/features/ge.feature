@@ -0,0 +1,55 @@
+Feature: Grammatical evolution
+
+  Scenario Outline: individuals carry the mapping of their genome, computed once
+    Given a GE search on the native PBO problem 1 of dimension 8 with genomes of length <length>
+    When we initialize the population and generate <children> children
+    Then every individual has the recipe and coding length its genome maps to
+    And every parent has its fitness
+    Examples:
+      | length | children |
+      | 50     | 20       |
+      | 200    | 20       |
+
+  Scenario Outline: fingerprint sets hold every distinct fingerprint once
+    Given an empty fingerprint set
+    When we add <count> fingerprints drawn from <distinct> distinct genomes
+    Then the fingerprint set holds <distinct> fingerprints, all of which it contains
+    Examples:
+      | count | distinct |
+      | 10    | 10       |
+      | 5000  | 3000     |
+
+  Scenario: genomes of children with a unique coding part are unique
+    Given a GE search on the native PBO problem 1 of dimension 8 with genomes of length 50
+    When we initialize the population and generate 20 valid children with unique coding genomes
+    Then no two individuals share their coding genome
+
+  Scenario: sized initialization encodes sentences of the requested sizes that observe the required terminals
+    Given a GE search on the native PBO problem 1 of dimension 8 with genomes of length 100, initialized with sentences of 3 to 12 terminals observing numeric_nullary_observable:rate
+    When we initialize the population and generate 20 children
+    Then every individual has the recipe and coding length its genome maps to
+    And every parent has 3 to 12 terminals, including numeric_nullary_observable:rate
+
+  Scenario Outline: children produced in the background don't depend on the random module
+    Given a GE search on the native PBO problem 1 of dimension 8 with genomes of length 100 and a child queue of <queue> on 2 workers
+    When we produce and evaluate the children of the initial population twice with child seed 5, drawing from the random module in between
+    Then both times the children have the same genomes and fitness
+    Examples:
+      | queue |
+      | 1     |
+      | 3     |
+
+  Scenario: children are only produced in the background for trials on the process pool
+    When we build a GE search with a child queue
+    Then a ValueError is raised
+
+  Scenario Outline: steady-state evolution spends exactly the outer budget
+    Given a steady-state GE search on the native PBO problem 1 of dimension 8 with outer budget <budget> and <workers> workers
+    When we initialize the population and run the search
+    Then the search used <budget> evaluations
+    And the parents are the best individuals, sorted by fitness, with their fitness
+    Examples:
+      | budget | workers |
+      | 12     | 0       |
+      | 12     | 2       |
+      | 13     | 3       |
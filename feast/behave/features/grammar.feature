@@ -0,0 +1,70 @@
+Feature: Deriving sentences from the grammar
+
+  Scenario Outline: genomes map to sentences, using one gene per derivation step
+    Given a grammar with <wraps> wraps
+    When we map the genome <genome> from <symbol>
+    Then the sentence is <sentence> with coding length <length>
+    Examples:
+      | wraps | genome          | symbol | sentence                                                                    | length |
+      | 0     | 2,0,0,15,0,5,9  | NUM    | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary:1        | 6      |
+      | 1     | 1,0,0           | NUM    | numeric_unary:negative\|numeric_nullary:-0.5                                | 3      |
+      | 1     | 1,0,0,16        | BOOL   | boolean_unary:not\|boolean_nullary:true                                     | 4      |
+
+  Scenario: genomes that run out before the derivation is complete cannot be mapped
+    Given a grammar with 0 wraps
+    Then mapping the genome 2,0,0,15 from NUM fails
+
+  Scenario Outline: random sentences respect the minimum length
+    Given a grammar with 0 wraps
+    When we produce 200 random sentences from <symbol> with soft limit <limit> and minimum length <minimum>
+    Then every sentence inflates to a tree of at least <minimum> nodes
+    Examples:
+      | symbol | limit | minimum |
+      | NUM    | 5     | 2       |
+      | BOOL   | 5     | 2       |
+      | NUM    | 3     | 4       |
+
+  Scenario: alternative terminals come from the same non-terminal
+    Given a grammar with 0 wraps
+    Then every terminal has alternatives from its own non-terminal
+
+  Scenario Outline: derivations resumed from the parent at the changed codon equal fresh derivations
+    Given a grammar with <wraps> wraps
+    When we derive 300 random genomes of length <length> with a mutant and a crossover child of each
+    Then resuming the parent derivations gives the same derivations of the children
+    Examples:
+      | wraps | length |
+      | 0     | 60     |
+      | 2     | 20     |
+
+  Scenario Outline: sized sentences have between the minimum and maximum size and contain the required terminals
+    Given a grammar with 0 wraps
+    When we produce 200 sentences from <symbol> of <minimum> to <maximum> terminals containing <required>
+    Then every sentence inflates to a tree of <minimum> to <maximum> nodes containing <required>
+    And the genomes encoding the derivations map to the same sentences
+    Examples:
+      | symbol | minimum | maximum | required                                                                           |
+      | NUM    | 1       | 1       | numeric_nullary_observable:rate                                                    |
+      | NUM    | 3       | 10      | numeric_nullary_observable:rate                                                    |
+      | NUM    | 5       | 20      | numeric_nullary_observable:rate,numeric_nullary_observable:dimension,boolean_nullary_observable:best_child_is_low |
+      | BOOL   | 2       | 30      | boolean_nullary_observable:best_child_is_low,boolean_nullary_observable:best_child_is_low |
+      | BOOL   | 8       | 8       | numeric_nullary_observable:rate                                                    |
+
+  Scenario: a maximum size too small for the required terminals is exceeded as little as possible
+    Given a grammar with 0 wraps
+    When we produce 50 sentences from NUM of 1 to 1 terminals containing numeric_nullary_observable:rate,boolean_nullary_observable:best_child_is_low
+    Then every sentence inflates to a tree of 4 to 4 nodes containing numeric_nullary_observable:rate,boolean_nullary_observable:best_child_is_low
+
+  Scenario Outline: enumeration yields every sentence once, by size, in any random order
+    Given a grammar with 0 wraps
+    When we enumerate the sentences from <symbol> of 1 to <maximum> terminals
+    Then there are <count> distinct sentences that inflate to trees, by increasing size
+    And shuffled enumeration yields the same sentences
+    Examples:
+      | symbol | maximum | count |
+      | NUM    | 2       | 34    |
+      | BOOL   | 3       | 1829  |
+
+  Scenario: shuffled enumeration can visit the sentences of a size in any order
+    Given a grammar with 0 wraps
+    Then 1000 shuffled enumerations of the sentences from BOOL of 1 terminal yield every one of their 24 orders
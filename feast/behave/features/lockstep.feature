@@ -0,0 +1,35 @@
+Feature: Two-rate EA runs in lockstep
+
+  Scenario Outline: every run stops at the optimum or at the end of its budget
+    Given the ioh PBO problem <problem_id> instance 1 of dimension 16
+    When we run 20 lockstep two-rate EA runs with budget <budget> and formula <recipe>
+    Then no run used more than <budget> evaluations
+    And every run reached the optimum or used its whole budget
+    Examples:
+      | problem_id | budget | recipe                                                                                                                                                                                 |
+      | 1          | 1000   | numeric_nullary_observable:rate                                                                                                                                                        |
+      | 19         | 250    | numeric_ternary:if\|boolean_nullary_observable:best_child_is_low\|numeric_binary:/\|numeric_nullary_observable:rate\|numeric_nullary:2\|numeric_binary:*\|numeric_nullary_observable:rate\|numeric_nullary:2 |
+      | 19         | 250    | numeric_binary:/\|numeric_nullary:1\|numeric_nullary:0                                                                                                                                 |
+
+  Scenario Outline: rates proposed by the adaptation formula are kept within [2, n/4]
+    When the formula proposes a rate of <proposed> at rate 3 in dimension 16
+    Then the rate becomes <rate>
+    Examples:
+      | proposed | rate |
+      | 3.5      | 3.5  |
+      | 0.1      | 2    |
+      | 100      | 4    |
+      | nan      | 3    |
+      | inf      | 3    |
+
+  Scenario Outline: both engines apply the rate proposed by the adaptation formula
+    Given the ioh PBO problem 19 instance 1 of dimension 16
+    When we run a two-rate EA with budget 100 and formula numeric_nullary:<proposed>
+    Then the two-rate EA ends at rate <rate>
+    When we run 5 lockstep two-rate EA runs with budget 100 and formula numeric_nullary:<proposed>
+    Then every lockstep run ends at rate <rate>
+    Examples:
+      | proposed | rate |
+      | 3        | 3    |
+      | 0.5      | 2    |
+      | 100      | 4    |
@@ -0,0 +1,19 @@
+Feature: NumPy mutation kernel of the two-rate EA
+
+  Scenario Outline: flip counts follow the binomial distribution conditioned on at least one flip
+    Given a mutation kernel seeded with 0
+    When we sample 20000 flip counts for dimension <dimension> at probability <probability>
+    Then every flip count is between 1 and <dimension>
+    And the mean flip count is within 2 percent of the conditional binomial mean
+    Examples:
+      | dimension | probability |
+      | 16        | 0.03125     |
+      | 16        | 0.25        |
+      | 1000      | 0.0005      |
+      | 1000      | 0.3         |
+      | 100       | 0.99        |
+
+  Scenario: mutation flips distinct bits of a copy of the parent
+    Given a mutation kernel seeded with 0
+    When we mutate an all-zero parent of dimension 64 at probability 0.5
+    Then the parent is unchanged and the child has at least one bit set
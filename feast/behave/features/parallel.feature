@@ -0,0 +1,23 @@
+Feature: Evaluating trials in worker processes
+
+  Scenario: a problem is rebuilt from its spec
+    Given the ioh PBO problem 19 instance 1 of dimension 16
+    When we rebuild the problem from its spec
+    Then the rebuilt problem is the same problem
+
+  Scenario: trials in a worker are reproducible from their seed
+    Given the ioh PBO problem 19 instance 1 of dimension 16
+    When we run a worker trial of numeric_binary:*|numeric_nullary_observable:rate|numeric_nullary_random:uniform twice with seed 42
+    Then both trials have the same score
+
+  Scenario: a seeded search gives the same results serially and on any number of workers
+    When we run the same seeded GE search on the native PBO problem 19 of dimension 16 serially and with 1 and 3 workers
+    Then all runs evaluate the same phenotypes to the same fitness and end with the same parents
+
+  Scenario Outline: trials on the process pool can't run in lockstep or be raced
+    When we build a GE search with plus survival and 2 workers and <option>
+    Then a ValueError is raised
+    Examples:
+      | option          |
+      | lockstep trials |
+      | racing          |
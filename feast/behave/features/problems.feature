@@ -0,0 +1,20 @@
+Feature: Native PBO problems match ioh
+
+  Scenario Outline: native problems score like ioh, one by one and in batches
+    Given the ioh PBO problem <problem_id> instance 1 of dimension <dimension>
+    And the native PBO problem <problem_id> instance 1 of dimension <dimension>
+    When both problems score 200 random solutions, all zeros and all ones
+    Then the native scores equal the ioh scores one by one and in a batch
+    And both problems have the same optimum and count the same evaluations
+    Examples:
+      | problem_id | dimension |
+      | 1          | 16        |
+      | 2          | 16        |
+      | 19         | 16        |
+      | 1          | 5         |
+      | 2          | 33        |
+      | 19         | 100       |
+
+  Scenario: other instances are rejected
+    When we ask for the native PBO problem 19 instance 2 of dimension 16
+    Then a ValueError is raised
@@ -0,0 +1,29 @@
+Feature: Racing the trials of a candidate against the survival threshold
+
+  Scenario Outline: candidates are dropped once their mean over all trials can't reach the threshold
+    Given <mode> racing with scores between 0 and 17 at confidence 0.05
+    When a candidate scored <scores> in its first trials out of <trials>
+    Then the candidate can't reach a threshold of <threshold>: <dropped>
+    Examples:
+      | mode      | scores           | trials | threshold | dropped |
+      | bound     | 10               | 5      | 15        | false   |
+      | bound     | 10, 10           | 5      | 15        | true    |
+      | bound     | 15, 15, 15, 15   | 5      | 15        | false   |
+      | bound     | 14, 14, 14, 14   | 5      | 15        | true    |
+      | bound     | 14, 14, 14, 14   | 5      | 14.5      | false   |
+      | bound     | 14, 14, 14, 14   | 4      | 15        | false   |
+      | hoeffding | 14, 14           | 5      | 15        | false   |
+      | hoeffding | 2, 2, 2          | 5      | 15        | true    |
+
+  Scenario: a child that can't beat the weakest parent stops after its first trial
+    Given a GE search on the native PBO problem 1 of dimension 8 racing 5 trials per evaluation
+    When we initialize the population and evaluate a new phenotype against parents of fitness 9
+    Then the child is dropped after 1 trial, with the mean of its scores as cached fitness
+
+  Scenario Outline: racing needs the trials of a candidate one after another
+    When we build a GE search with plus survival and racing and <option>
+    Then a ValueError is raised
+    Examples:
+      | option             |
+      | successive halving |
+      | lockstep trials    |
@@ -0,0 +1,6 @@
+Feature: Random search
+
+  Scenario: enumerating random search never tries a phenotype twice
+    Given an enumerating random search on the native PBO problem 1 of dimension 8 observing numeric_nullary_observable:rate
+    When we initialize the population and generate 300 children
+    Then no two candidates share their phenotype, and all of them observe numeric_nullary_observable:rate
@@ -0,0 +1,24 @@
+Feature: Behavioural signatures of formulas
+
+  Scenario Outline: formulas are matched on their behaviour over the probe observables
+    Given a recipe <recipe>
+    And another recipe <other>
+    When we compare the behavioural signatures of both recipes with tolerance <tolerance>
+    Then the signatures match: <match>
+    Examples:
+      | recipe                                                                          | other                                                                                       | tolerance | match |
+      | numeric_binary:*\|numeric_nullary_observable:rate\|numeric_nullary:2            | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary_observable:rate          | 0         | true  |
+      | numeric_binary:*\|numeric_nullary_observable:rate\|numeric_nullary:2            | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary:2                        | 0         | false |
+      | numeric_nullary_observable:rate                                                 | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary:0.1                      | 0         | false |
+      | numeric_nullary_observable:rate                                                 | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary:0.1                      | 0.2       | true  |
+      | numeric_nullary_random:uniform                                                  | numeric_binary:*\|numeric_nullary:1\|numeric_nullary_random:uniform                         | 0         | true  |
+      | numeric_binary:max\|numeric_nullary_observable:rate\|numeric_nullary:2          | numeric_nullary_observable:rate                                                             | 0         | true  |
+
+  Scenario: a search reuses the fitness of a formula that behaves the same within the rate bounds
+    Given a random search on the native PBO problem 19 of dimension 16 caching behavioural signatures
+    When the search evaluates numeric_nullary_observable:rate and then numeric_binary:max|numeric_nullary_observable:rate|numeric_nullary:2
+    Then the second formula gets the fitness of the first from its behavioural signature, without using budget
+
+  Scenario: default behavioural signatures need the rate bounds of the inner heuristic
+    When we build a GE search with behavioural signatures
+    Then a ValueError is raised
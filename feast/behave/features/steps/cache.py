@@ -0,0 +1,49 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from behave import *
+
+from feast.cache import EvaluationContext, MemoryEvaluationCache, SqliteEvaluationCache
+
+CONTEXT = EvaluationContext(19, 1, 16, 5000, 16)
+
+
+def parse_scores(scores):
+    return [float(score) for score in scores.split(',')]
+
+
+@given('an empty {backend} evaluation cache')
+def step_implementation(context, backend):
+    if backend == 'memory':
+        context.evaluation_cache = MemoryEvaluationCache()
+    else:
+        directory = tempfile.mkdtemp()
+        context.evaluation_cache = SqliteEvaluationCache(os.path.join(directory, 'evaluations.sqlite'))
+
+
+@when('we store the scores {scores} for {phenotype} with {trials:d} trials')
+def step_implementation(context, scores, phenotype, trials):
+    context.evaluation_cache.put(CONTEXT.key(trials, phenotype), parse_scores(scores))
+
+
+@when('another process stores the scores {scores} for {phenotype} with {trials:d} trials')
+def step_implementation(context, scores, phenotype, trials):
+    context.evaluation_cache.get(CONTEXT.key(trials, phenotype))  # opens a connection in this process first
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        executor.submit(context.evaluation_cache.put, CONTEXT.key(trials, phenotype), parse_scores(scores)).result()
+
+
+@then('the cache has the scores {scores} for {phenotype} with {trials:d} trials')
+def step_implementation(context, scores, phenotype, trials):
+    assert context.evaluation_cache.get(CONTEXT.key(trials, phenotype)) == parse_scores(scores)
+
+
+@then('the cache has no scores for {phenotype} with {trials:d} trials')
+def step_implementation(context, phenotype, trials):
+    assert context.evaluation_cache.get(CONTEXT.key(trials, phenotype)) is None
+
+
+@then('the cache has no scores for {phenotype} with {trials:d} trials of scores version {version:d}')
+def step_implementation(context, phenotype, trials, version):
+    assert context.evaluation_cache.get(CONTEXT._replace(version=version).key(trials, phenotype)) is None
@@ -0,0 +1,150 @@
+import math
+import random
+
+import numpy as np
+from behave import *
+
+import feast.tree as tree
+from feast.grammar import Grammar
+
+
+@given('a grammar with {wraps:d} wraps')
+def step_implementation(context, wraps):
+    context.grammar = Grammar(wraparound=wraps)
+
+
+@when('we map the genome {genome} from {symbol}')
+def step_implementation(context, genome, symbol):
+    genome = [int(gene) for gene in genome.split(',')]
+    context.sentence = context.grammar.get_sentence_from_genome(genome, symbol)
+    context.coding_length = context.grammar.get_genome_coding_length(genome, symbol)
+
+
+@then('the sentence is {sentence} with coding length {length:d}')
+def step_implementation(context, sentence, length):
+    assert context.sentence == sentence, f'{context.sentence} is not equal to {sentence}'
+    assert context.coding_length == length, f'{context.coding_length} is not equal to {length}'
+
+
+@then('mapping the genome {genome} from {symbol} fails')
+def step_implementation(context, genome, symbol):
+    try:
+        context.grammar.get_sentence_from_genome([int(gene) for gene in genome.split(',')], symbol)
+    except ValueError:
+        return
+    assert False, f'{genome} was mapped'
+
+
+@when('we produce {count:d} random sentences from {symbol} with soft limit {limit:d} and minimum length {minimum:d}')
+def step_implementation(context, count, symbol, limit, minimum):
+    random.seed(count)
+    context.sentences = [context.grammar.produce_random_sentence(symbol, soft_limit=limit, minimum_length=minimum)
+                         for _ in range(count)]
+
+
+@then('every sentence inflates to a tree of at least {minimum:d} nodes')
+def step_implementation(context, minimum):
+    for sentence in context.sentences:
+        tree.create(sentence)
+        assert len(sentence.split('|')) >= minimum, f'{sentence} is too short'
+
+
+@then('every terminal has alternatives from its own non-terminal')
+def step_implementation(context):
+    grammar = context.grammar
+    for terminal in grammar.terminals:
+        alternative = grammar.get_alternative_terminal(terminal)
+        if alternative is None:
+            assert len(grammar.productions[grammar.reductions[terminal]]) == 1
+            continue
+        assert alternative != terminal
+        assert grammar.reductions[alternative] == grammar.reductions[terminal]
+
+
+@when('we derive {count:d} random genomes of length {length:d} with a mutant and a crossover child of each')
+def step_implementation(context, count, length):
+    random.seed(count)
+    context.children = []
+    for _ in range(count):
+        genome = [random.randint(0, 9999) for _ in range(length)]
+        derivation = context.grammar.derive_from_genome(genome, 'NUM')
+        mutant = genome.copy()
+        point = random.randint(0, length - 1)
+        mutant[point] = random.randint(0, 9999)
+        context.children.append((mutant, derivation, point))
+        point = random.randint(0, length)
+        other = [random.randint(0, 9999) for _ in range(length)]
+        context.children.append((genome[:point] + other[point:], derivation, point))
+
+
+@then('resuming the parent derivations gives the same derivations of the children')
+def step_implementation(context):
+    grammar = context.grammar
+    for genome, parent, point in context.children:
+        resumed = grammar.derive_from_genome(genome, 'NUM', parent, point)
+        fresh = grammar.derive_from_genome(genome, 'NUM')
+        assert resumed.complete == fresh.complete
+        assert grammar.get_derived_sentence(resumed) == grammar.get_derived_sentence(fresh)
+        if fresh.complete:
+            assert resumed.coding_length == fresh.coding_length
+            sentence, coding_length = grammar._produce_from_genome(genome, 'NUM')
+            assert (sentence, coding_length) == (grammar.get_derived_sentence(fresh), fresh.coding_length)
+
+
+@when('we produce {count:d} sentences from {symbol} of {minimum:d} to {maximum:d} terminals containing {required}')
+def step_implementation(context, count, symbol, minimum, maximum, required):
+    random.seed(count)
+    context.symbol = symbol
+    context.derivations = [context.grammar.produce_sized_derivation(symbol, minimum, maximum, required.split(','))
+                           for _ in range(count)]
+
+
+@then('every sentence inflates to a tree of {minimum:d} to {maximum:d} nodes containing {required}')
+def step_implementation(context, minimum, maximum, required):
+    for sentence, _ in context.derivations:
+        tree.create(sentence)
+        terminals = sentence.split('|')
+        assert minimum <= len(terminals) <= maximum, f'{sentence} is not of {minimum} to {maximum} terminals'
+        for terminal in set(required.split(',')):
+            assert terminals.count(terminal) >= required.split(',').count(terminal), f'{sentence} misses {terminal}'
+
+
+@then('the genomes encoding the derivations map to the same sentences')
+def step_implementation(context):
+    rng = np.random.default_rng(0)
+    for sentence, choices in context.derivations:
+        genome = context.grammar.encode_genome(choices, 100, 10000, rng)
+        assert context.grammar.get_sentence_from_genome(genome, context.symbol) == sentence
+        assert context.grammar.get_genome_coding_length(genome, context.symbol) == len(choices)
+
+
+@when('we enumerate the sentences from {symbol} of 1 to {maximum:d} terminals')
+def step_implementation(context, symbol, maximum):
+    context.symbol = symbol
+    context.maximum = maximum
+    context.sentences = list(context.grammar.enumerate_sentences(symbol, 1, maximum))
+
+
+@then('there are {count:d} distinct sentences that inflate to trees, by increasing size')
+def step_implementation(context, count):
+    assert len(set(context.sentences)) == len(context.sentences) == count
+    sizes = [len(sentence.split('|')) for sentence in context.sentences]
+    assert sizes == sorted(sizes)
+    for sentence in context.sentences:
+        assert tree.create(sentence).serialize() == sentence
+
+
+@then('shuffled enumeration yields the same sentences')
+def step_implementation(context):
+    random.seed(0)
+    shuffled = list(context.grammar.enumerate_sentences(context.symbol, 1, context.maximum, shuffle=True))
+    assert shuffled != context.sentences and sorted(shuffled) == sorted(context.sentences)
+
+
+@then('{enumerations:d} shuffled enumerations of the sentences from {symbol} of {size:d} terminal yield '
+      'every one of their {orders:d} orders')
+def step_implementation(context, enumerations, symbol, size, orders):
+    rng = random.Random(0)
+    seen = {tuple(context.grammar.enumerate_sentences(symbol, size, size, shuffle=True, rng=rng))
+            for _ in range(enumerations)}
+    assert len(seen) == orders and math.factorial(context.grammar.count_sentences(symbol, size)) == orders
@@ -0,0 +1,471 @@
+import random
+
+import ioh
+import numpy as np
+from behave import *
+
+from feast.cache import EvaluationContext, MemoryEvaluationCache
+from feast.fingerprint import FingerprintSet, fingerprint_array
+import feast.problems as problems
+import feast.tree as tree
+from feast.grammar import Grammar
+from feast.hyperheuristics import GE, RandomSearch
+from feast.hyperheuristics.fidelity import SuccessiveHalving
+from feast.hyperheuristics.parallel import ProblemSpec, run_trial_in_worker
+from feast.hyperheuristics.racing import Racing
+from feast.hyperheuristics.signature import BehaviouralSignature, SignatureCache, get_default_probes
+from metaheuristics.tworate import TwoRateEa
+
+
+@when('we compare the behavioural signatures of both recipes with tolerance {tolerance:g}')
+def step_implementation(context, tolerance):
+    signature = BehaviouralSignature(get_default_probes(16, TwoRateEa.rate_bounds(16)))
+    cache = SignatureCache(tolerance)
+    cache.add(signature(tree.create(context.recipe)), 1.0)
+    context.match = cache.get(signature(tree.create(context.other_recipe))) is not None
+
+
+@then('the signatures match: {match}')
+def step_implementation(context, match):
+    assert context.match is (match == 'true')
+
+
+@given('the ioh PBO problem {problem_id:d} instance {instance:d} of dimension {dimension:d}')
+def step_implementation(context, problem_id, instance, dimension):
+    context.problem = ioh.get_problem(problem_id, instance, dimension, ioh.ProblemClass.PBO)
+
+
+@when('we rebuild the problem from its spec')
+def step_implementation(context):
+    context.rebuilt_problem = ProblemSpec.from_problem(context.problem).build()
+
+
+@then('the rebuilt problem is the same problem')
+def step_implementation(context):
+    assert str(context.rebuilt_problem.meta_data) == str(context.problem.meta_data)
+    x = [i % 3 == 0 for i in range(context.problem.meta_data.n_variables)]
+    assert context.rebuilt_problem(x) == context.problem(x)
+
+
+@when('we run a worker trial of {recipe} twice with seed {seed:d}')
+def step_implementation(context, recipe, seed):
+    import common
+    problem_spec = ProblemSpec.from_problem(context.problem)
+    context.scores = [run_trial_in_worker(problem_spec, common.build_two_rate_ea, recipe, seed) for _ in range(2)]
+
+
+@then('both trials have the same score')
+def step_implementation(context):
+    assert context.scores[0] == context.scores[1]
+
+
+@given('{mode} racing with scores between {lower:g} and {upper:g} at confidence {confidence:g}')
+def step_implementation(context, mode, lower, upper, confidence):
+    context.racing = Racing(mode, (lower, upper), confidence)
+
+
+@when('a candidate scored {scores} in its first trials out of {trials:d}')
+def step_implementation(context, scores, trials):
+    context.scores = [float(score) for score in scores.split(',')]
+    context.trials = trials
+
+
+@then("the candidate can't reach a threshold of {threshold:g}: {dropped}")
+def step_implementation(context, threshold, dropped):
+    assert context.racing.cannot_reach(context.scores, context.trials, threshold) is (dropped == 'true')
+
+
+@given('successive halving over {number_of_rungs:d} rungs with eta {eta:g}, '
+       'an inner budget of {inner_budget:d} and {trials:d} trials')
+def step_implementation(context, number_of_rungs, eta, inner_budget, trials):
+    context.scheduler = SuccessiveHalving.geometric(inner_budget, trials, number_of_rungs, eta)
+
+
+@then('the rungs are {rungs}')
+def step_implementation(context, rungs):
+    assert ', '.join(f"({budget}, {trials})" for budget, trials in context.scheduler.rungs) == rungs
+
+
+@when('the scores {scores} are seen on rung {rung:d}')
+def step_implementation(context, scores, rung):
+    context.promotions = context.scheduler.promote(rung, [float(score) for score in scores.split(',')])
+
+
+@then('the promotions are {promotions}')
+def step_implementation(context, promotions):
+    assert context.promotions == [promotion.strip() == 'true' for promotion in promotions.split(',')]
+
+
+def build_small_two_rate_ea(problem, evaluate, budget=None):
+    heuristic = TwoRateEa(4)
+    heuristic.configure(problem, 100 if budget is None else budget, {'adaptation': evaluate})
+    heuristic.initialize_population()
+    return heuristic
+
+
+@given('a GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'with genomes of length {length:d}')
+def step_implementation(context, problem_id, dimension, length):
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=build_small_two_rate_ea, outer_budget=10, parent_population_size=5,
+                        child_population_size=1, mutation_probability=0.5, crossover_probability=0.5,
+                        trials_per_evaluation=1, genome_length=length, random_seed=1)
+
+
+@given('a GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'with genomes of length {length:d}, initialized with sentences of {minimum:d} to {maximum:d} terminals '
+       'observing {terminal}')
+def step_implementation(context, problem_id, dimension, length, minimum, maximum, terminal):
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=build_small_two_rate_ea, outer_budget=10, parent_population_size=5,
+                        child_population_size=1, mutation_probability=0.5, crossover_probability=0.5,
+                        trials_per_evaluation=1, genome_length=length, random_seed=1, must_observe=[terminal],
+                        sentence_sizes=(minimum, maximum))
+
+
+@when('we initialize the population and generate {children:d} children')
+def step_implementation(context, children):
+    context.search.initialize_population()
+    context.children = [context.search._generate_child() for _ in range(children)]
+
+
+@then('every individual has the recipe and coding length its genome maps to')
+def step_implementation(context):
+    search = context.search
+    for individual in search.parent_population + context.children:
+        try:
+            recipe, coding_length = search.grammar._produce_from_genome(individual.genome, 'NUM')
+        except ValueError:
+            assert individual.recipe is None and individual.tree is None
+            continue
+        assert individual.recipe == recipe and individual.coding_length == coding_length
+        assert individual.tree.serialize() == recipe
+
+
+@then('every parent has {minimum:d} to {maximum:d} terminals, including {terminal}')
+def step_implementation(context, minimum, maximum, terminal):
+    for parent in context.search.parent_population:
+        terminals = parent.recipe.split('|')
+        assert minimum <= len(terminals) <= maximum and terminal in terminals, parent.recipe
+
+
+@then('every parent has its fitness')
+def step_implementation(context):
+    search = context.search
+    assert [parent.fitness for parent in search.parent_population] == search.parent_population_fitness
+
+
+@given('an empty fingerprint set')
+def step_implementation(context):
+    context.fingerprints = FingerprintSet(capacity=4)
+
+
+@when('we add {count:d} fingerprints drawn from {distinct:d} distinct genomes')
+def step_implementation(context, count, distinct):
+    rng = np.random.default_rng(count)
+    genomes = [np.arange(i, i + 10, dtype=np.int32) for i in range(distinct)]
+    context.keys = [fingerprint_array(genome) for genome in genomes] + [0]
+    context.fingerprints.add(0)
+    for i in range(count):
+        context.fingerprints.add(context.keys[i if i < distinct else rng.integers(0, distinct)])
+
+
+@then('the fingerprint set holds {distinct:d} fingerprints, all of which it contains')
+def step_implementation(context, distinct):
+    assert len(context.fingerprints) == distinct + 1, f'{len(context.fingerprints)} is not equal to {distinct + 1}'
+    for key in context.keys:
+        assert key in context.fingerprints
+    assert not context.fingerprints.add(context.keys[0])
+
+
+@when('we initialize the population and generate {children:d} valid children with unique coding genomes')
+def step_implementation(context, children):
+    search = context.search
+    search.enforce_unique_coding_genotypes = True
+    search.initialize_population()
+    context.children = []
+    while len(context.children) < children:
+        child = search._generate_child()
+        if search._validate(child):
+            context.children.append(child)
+
+
+@then('no two individuals share their coding genome')
+def step_implementation(context):
+    coding_genomes = [tuple(individual.genome[:individual.coding_length].tolist())
+                      for individual in context.search.parent_population + context.children]
+    assert len(set(coding_genomes)) == len(coding_genomes)
+
+
+@given('an enumerating random search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'observing {terminal}')
+def step_implementation(context, problem_id, dimension, terminal):
+    context.search = RandomSearch(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                                  build_inner_heuristic=build_small_two_rate_ea, outer_budget=10,
+                                  trials_per_evaluation=1, must_observe=[terminal], random_seed=1,
+                                  enumerate_sentences=True)
+
+
+@then('no two candidates share their phenotype, and all of them observe {terminal}')
+def step_implementation(context, terminal):
+    candidates = context.search.parent_population + context.children
+    phenotypes = [candidate.canonicalize().serialize() for candidate in candidates]
+    assert len(set(phenotypes)) == len(phenotypes)
+    for candidate in candidates:
+        assert terminal in candidate.serialize().split('|')
+
+
+
+@given('a GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'with genomes of length {length:d} and a child queue of {queue:d} on {workers:d} workers')
+def step_implementation(context, problem_id, dimension, length, queue, workers):
+    import common  # workers need a builder they can import
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=common.build_two_rate_ea, outer_budget=10, parent_population_size=5,
+                        child_population_size=6, mutation_probability=0.5, crossover_probability=0.5,
+                        trials_per_evaluation=1, genome_length=length, random_seed=1, n_workers=workers,
+                        child_queue_size=queue)
+
+
+@when('we produce and evaluate the children of the initial population twice with child seed {seed:d}, '
+      'drawing from the random module in between')
+def step_implementation(context, seed):
+    search = context.search
+    search.initialize_population()
+    context.generations = []
+    for draws in [0, 100]:
+        for _ in range(draws):
+            random.random()
+        search.child_seeds = random.Random(seed)
+        context.generations.append(search._produce_and_evaluate_children())
+
+
+@then('both times the children have the same genomes and fitness')
+def step_implementation(context):
+    (first, first_fitness), (second, second_fitness) = context.generations
+    assert len(first) == len(second) == context.search.child_population_size
+    for child, other in zip(first, second):
+        assert np.array_equal(child.genome, other.genome)
+    assert [child.fitness for child in first] == first_fitness
+
+
+@given('a steady-state GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'with outer budget {budget:d} and {workers:d} workers')
+def step_implementation(context, problem_id, dimension, budget, workers):
+    import common  # workers need a builder they can import
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=common.build_two_rate_ea if workers else build_small_two_rate_ea,
+                        outer_budget=budget, parent_population_size=4, child_population_size=1,
+                        mutation_probability=0.5, crossover_probability=0.5, trials_per_evaluation=2,
+                        genome_length=100, survival='plus', random_seed=1, n_workers=workers or None,
+                        steady_state=True)
+
+
+@when('we initialize the population and run the search')
+def step_implementation(context):
+    context.search.initialize_population()
+    context.initial_fitness = list(context.search.parent_population_fitness)
+    context.search.run()
+
+
+@then('the search used {budget:d} evaluations')
+def step_implementation(context, budget):
+    assert context.search.budget_used == budget, context.search.budget_used
+
+
+@then('the parents are the best individuals, sorted by fitness, with their fitness')
+def step_implementation(context):
+    search = context.search
+    fitness = search.parent_population_fitness
+    assert len(search.parent_population) == search.parent_population_size
+    assert fitness == sorted(fitness, reverse=True)
+    assert min(fitness) >= min(context.initial_fitness)
+    assert [parent.fitness for parent in search.parent_population] == fitness
+
+
+def conflicting_settings(settings):
+    import common
+    options = {
+        'comma survival': {'survival': 'comma'},
+        'plus survival': {'survival': 'plus'},
+        'successive halving': {'fidelity_scheduler': SuccessiveHalving.geometric(100, 2, 2)},
+        'racing': {'racing': 'bound'},
+        'lockstep trials': {'build_lockstep_inner_heuristic': common.build_lockstep_two_rate_ea},
+        '2 workers': {'n_workers': 2},
+        'behavioural signatures': {'cache_behavioural_signatures': True},
+        'a child queue': {'child_queue_size': 2},
+        'an evaluation cache of another inner budget': {'evaluation_cache': MemoryEvaluationCache(),
+                                                        'evaluation_context': EvaluationContext(1, 1, 8, 5000, 4)},
+    }
+    keyword_arguments = {}
+    for setting in settings.split(' and '):
+        keyword_arguments.update(options[setting])
+    return keyword_arguments
+
+
+@when('we build a GE search with {settings}')
+def step_implementation(context, settings):
+    try:
+        GE(Grammar(), 'NUM', problem=problems.get_problem(1, 1, 8), build_inner_heuristic=build_small_two_rate_ea,
+           outer_budget=10, parent_population_size=5, child_population_size=1, mutation_probability=0.5,
+           crossover_probability=0.5, trials_per_evaluation=2, genome_length=100,
+           **conflicting_settings(settings))
+        context.error = None
+    except ValueError as e:
+        context.error = e
+
+
+@given('a GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} with successive halving '
+       'over {number_of_rungs:d} rungs, caching phenotypes and behavioural signatures')
+def step_implementation(context, problem_id, dimension, number_of_rungs):
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=build_small_two_rate_ea, outer_budget=20, parent_population_size=5,
+                        child_population_size=9, mutation_probability=0.5, crossover_probability=0.5,
+                        trials_per_evaluation=3, genome_length=100, survival='plus', random_seed=1,
+                        cache_phenotype_evaluations=True, cache_behavioural_signatures=True,
+                        probe_rate_bounds=TwoRateEa.rate_bounds(dimension),
+                        fidelity_scheduler=SuccessiveHalving.geometric(100, 3, number_of_rungs))
+
+
+@when('we initialize the population and evaluate {children:d} children')
+def step_implementation(context, children):
+    search = context.search
+    search.initialize_population()
+    context.budget_used = search.budget_used
+    context.initial_promotions = list(search.fidelity_scheduler.promotions)
+    context.children = [search._generate_valid_child() for _ in range(children)]
+    context.children_fitness = search._evaluate_population(context.children)
+
+
+@then('the initial population was evaluated on the last rung only')
+def step_implementation(context):
+    search = context.search
+    assert search.fidelity_scheduler.rejected_fitness not in search.parent_population_fitness
+    assert context.initial_promotions == [0] * (len(search.fidelity_scheduler.rungs) - 1)
+
+
+@then('the children used {evaluations:d} evaluations, and {rejected:d} of them were rejected before the last rung')
+def step_implementation(context, evaluations, rejected):
+    search = context.search
+    assert search.budget_used - context.budget_used == evaluations, search.budget_used - context.budget_used
+    rejected_fitness = search.fidelity_scheduler.rejected_fitness
+    assert context.children_fitness.count(rejected_fitness) == rejected, context.children_fitness
+
+
+@then('only the fitness of fully evaluated phenotypes is cached')
+def step_implementation(context):
+    search = context.search
+    rejected_fitness = search.fidelity_scheduler.rejected_fitness
+    for child, fitness in zip(context.children, context.children_fitness):
+        serialized_phenotype = search._phenotype(child).serialize()
+        if fitness == rejected_fitness:
+            assert serialized_phenotype not in search.evaluated_phenotypes_cache
+        else:
+            assert search.evaluated_phenotypes_cache[serialized_phenotype] == fitness
+    assert rejected_fitness not in search.evaluated_phenotypes_cache.values()
+    assert rejected_fitness not in search.signature_cache.fitnesses
+
+
+@when('we run the same seeded GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+      'serially and with {workers} workers')
+def step_implementation(context, problem_id, dimension, workers):
+    import common  # workers need a builder they can import
+    context.runs = []
+    for n_workers in [None] + [int(count) for count in workers.split(' and ')]:
+        search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                    build_inner_heuristic=common.build_two_rate_ea, outer_budget=12, parent_population_size=3,
+                    child_population_size=3, mutation_probability=0.5, crossover_probability=0.5,
+                    trials_per_evaluation=2, genome_length=100, survival='plus', random_seed=3,
+                    cache_phenotype_evaluations=True, n_workers=n_workers)
+        search.initialize_population()
+        search.run()
+        context.runs.append((list(search.evaluated_phenotypes_cache.items()),
+                             [parent.recipe for parent in search.parent_population], search.budget_used))
+
+
+@then('all runs evaluate the same phenotypes to the same fitness and end with the same parents')
+def step_implementation(context):
+    for run in context.runs[1:]:
+        assert run == context.runs[0], (run, context.runs[0])
+
+
+@given('a GE search on the native PBO problem {problem_id:d} of dimension {dimension:d} racing '
+       '{trials:d} trials per evaluation')
+def step_implementation(context, problem_id, dimension, trials):
+    context.search = GE(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                        build_inner_heuristic=build_small_two_rate_ea, outer_budget=10, parent_population_size=5,
+                        child_population_size=1, mutation_probability=0.5, crossover_probability=0.5,
+                        trials_per_evaluation=trials, genome_length=100, survival='plus', random_seed=1,
+                        cache_phenotype_evaluations=True, racing='bound')
+
+
+@when('we initialize the population and evaluate a new phenotype against parents of fitness {fitness:g}')
+def step_implementation(context, fitness):
+    search = context.search
+    search.initialize_population()
+    search.parent_population_fitness = [fitness] * search.parent_population_size
+    context.child = search._generate_valid_child()
+    while search._phenotype(context.child).serialize() in search.evaluated_phenotypes_cache:
+        context.child = search._generate_valid_child()
+    context.budget_used = search.budget_used
+    context.child_fitness = search._evaluate(context.child)
+
+
+@then('the child is dropped after {trials:d} trial, with the mean of its scores as cached fitness')
+def step_implementation(context, trials):
+    search = context.search
+    serialized_phenotype = search._phenotype(context.child).serialize()
+    scores = search.racing_evidence[serialized_phenotype]
+    assert len(scores) == trials
+    assert search.racing_trials_saved == search.trials_per_evaluation - trials
+    assert context.child_fitness == np.mean(scores) == search.evaluated_phenotypes_cache[serialized_phenotype]
+    assert search.budget_used == context.budget_used + 1
+
+
+def build_cached_ge_search(evaluation_cache):
+    problem = problems.get_problem(1, 1, 8)
+    return GE(Grammar(), 'NUM', problem=problem, build_inner_heuristic=build_small_two_rate_ea, outer_budget=10,
+              parent_population_size=5, child_population_size=1, mutation_probability=0.5,
+              crossover_probability=0.5, trials_per_evaluation=2, genome_length=100, random_seed=1,
+              evaluation_cache=evaluation_cache, evaluation_context=EvaluationContext.from_problem(problem, 100, 4))
+
+
+@when('two GE searches with the same seed initialize their population, sharing an evaluation cache')
+def step_implementation(context):
+    evaluation_cache = MemoryEvaluationCache()
+    context.searches = [build_cached_ge_search(evaluation_cache) for _ in range(2)]
+    for search in context.searches:
+        search.initialize_population()
+
+
+@then('both searches used {evaluations:d} evaluations, and the second one took all of them from the cache')
+def step_implementation(context, evaluations):
+    first, second = context.searches
+    assert first.budget_used == second.budget_used == evaluations
+    assert first.evaluation_cache_hits == 0 and second.evaluation_cache_hits == evaluations
+    assert second.parent_population_fitness == first.parent_population_fitness
+
+
+@given('a random search on the native PBO problem {problem_id:d} of dimension {dimension:d} '
+       'caching behavioural signatures')
+def step_implementation(context, problem_id, dimension):
+    context.search = RandomSearch(Grammar(), 'NUM', problem=problems.get_problem(problem_id, 1, dimension),
+                                  build_inner_heuristic=build_small_two_rate_ea, outer_budget=10,
+                                  trials_per_evaluation=2, random_seed=1, cache_behavioural_signatures=True,
+                                  probe_rate_bounds=TwoRateEa.rate_bounds(dimension))
+
+
+@when('the search evaluates {recipe} and then {other_recipe}')
+def step_implementation(context, recipe, other_recipe):
+    search = context.search
+    context.fitness = [search._evaluate(tree.create(recipe))]
+    context.budget_used = search.budget_used
+    context.fitness.append(search._evaluate(tree.create(other_recipe)))
+
+
+@then('the second formula gets the fitness of the first from its behavioural signature, without using budget')
+def step_implementation(context):
+    search = context.search
+    assert search.signature_cache_hits == 1 and search.phenotype_cache_hits == 0
+    assert context.fitness[1] == context.fitness[0]
+    assert search.budget_used == context.budget_used
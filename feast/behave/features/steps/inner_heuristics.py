@@ -0,0 +1,147 @@
+import numpy as np
+from behave import *
+
+import feast.problems as problems
+import feast.tree as tree
+from metaheuristics.lockstep import LockstepTwoRateEa
+from metaheuristics.mutation import mutate, sample_flip_count
+from metaheuristics.tworate import TwoRateEa
+
+
+@given('a mutation kernel seeded with {seed:d}')
+def step_implementation(context, seed):
+    context.rng = np.random.default_rng(seed)
+
+
+@when('we sample {samples:d} flip counts for dimension {dimension:d} at probability {probability:g}')
+def step_implementation(context, samples, dimension, probability):
+    context.dimension = dimension
+    context.probability = probability
+    context.flip_counts = [sample_flip_count(context.rng, dimension, probability) for _ in range(samples)]
+
+
+@then('every flip count is between 1 and {dimension:d}')
+def step_implementation(context, dimension):
+    assert 1 <= min(context.flip_counts) and max(context.flip_counts) <= dimension
+
+
+@then('the mean flip count is within {percentage:g} percent of the conditional binomial mean')
+def step_implementation(context, percentage):
+    n, p = context.dimension, context.probability
+    expected = n * p / (1 - (1 - p) ** n)
+    assert abs(np.mean(context.flip_counts) - expected) <= expected * percentage / 100
+
+
+@when('we mutate an all-zero parent of dimension {dimension:d} at probability {probability:g}')
+def step_implementation(context, dimension, probability):
+    context.parent = np.zeros(dimension, dtype=np.uint8)
+    context.child = mutate(context.rng, context.parent, probability)
+
+
+@then('the parent is unchanged and the child has at least one bit set')
+def step_implementation(context):
+    assert context.parent.sum() == 0
+    assert context.child.sum() >= 1
+    assert context.child.dtype == np.uint8
+
+
+@when('we run {runs:d} lockstep two-rate EA runs with budget {budget:d} and formula {recipe}')
+def step_implementation(context, runs, budget, recipe):
+    heuristic = LockstepTwoRateEa(16, runs)
+    heuristic.configure(context.problem, budget, {'adaptation': tree.create(recipe).evaluate_batch})
+    heuristic.initialize_population()
+    context.y_best, context.x_best, context.evaluations = heuristic.run()
+    context.budget = budget
+    context.lockstep_rate = heuristic.rate
+    context.problem.reset()
+
+
+@then('no run used more than {budget:d} evaluations')
+def step_implementation(context, budget):
+    assert context.evaluations.max() <= budget
+
+
+@then('every run reached the optimum or used its whole budget')
+def step_implementation(context):
+    optimum = context.problem.optimum.y
+    for y_best, x_best, evaluations in zip(context.y_best, context.x_best, context.evaluations):
+        assert y_best >= optimum or evaluations == context.budget
+        assert context.problem(x_best) == y_best
+
+
+@when('the formula proposes a rate of {proposed:g} at rate {rate:g} in dimension {dimension:d}')
+def step_implementation(context, proposed, rate, dimension):
+    context.rate = TwoRateEa.bound_rate(proposed, rate, dimension)
+
+
+@then('the rate becomes {rate:g}')
+def step_implementation(context, rate):
+    assert context.rate == rate
+
+
+@when('we run a two-rate EA with budget {budget:d} and formula {recipe}')
+def step_implementation(context, budget, recipe):
+    heuristic = TwoRateEa(16)
+    heuristic.configure(context.problem, budget, {'adaptation': tree.create(recipe).evaluate})
+    heuristic.initialize_population()
+    heuristic.run()
+    context.rate = heuristic.rate
+    context.problem.reset()
+
+
+@then('the two-rate EA ends at rate {rate:g}')
+def step_implementation(context, rate):
+    assert context.rate == rate
+
+
+@then('every lockstep run ends at rate {rate:g}')
+def step_implementation(context, rate):
+    assert (context.lockstep_rate == rate).all()
+
+
+@given('the native PBO problem {problem_id:d} instance {instance:d} of dimension {dimension:d}')
+def step_implementation(context, problem_id, instance, dimension):
+    context.native_problem = problems.get_problem(problem_id, instance, dimension)
+
+
+@when('both problems score {samples:d} random solutions, all zeros and all ones')
+def step_implementation(context, samples):
+    dimension = context.problem.meta_data.n_variables
+    population = np.random.default_rng(0).integers(0, 2, (samples, dimension), dtype=np.uint8)
+    context.population = np.concatenate([population, np.zeros((1, dimension), dtype=np.uint8),
+                                         np.ones((1, dimension), dtype=np.uint8)])
+    context.problem.reset()
+    context.ioh_scores = [context.problem(x.tolist()) for x in context.population]
+    context.native_scores = [context.native_problem(x) for x in context.population]
+    context.native_batch_scores = context.native_problem.evaluate_batch(context.population).tolist()
+
+
+@then('the native scores equal the ioh scores one by one and in a batch')
+def step_implementation(context):
+    assert context.native_scores == context.ioh_scores
+    assert context.native_batch_scores == context.ioh_scores
+
+
+@then('both problems have the same optimum and count the same evaluations')
+def step_implementation(context):
+    assert context.native_problem.optimum.y == context.problem.optimum.y
+    assert list(context.native_problem.optimum.x) == list(context.problem.optimum.x)
+    assert context.native_problem.state.evaluations == 2 * context.problem.state.evaluations
+    assert context.native_problem.state.current_best.y == context.problem.state.current_best.y
+    context.native_problem.reset()
+    assert context.native_problem.state.evaluations == 0
+    context.problem.reset()
+
+
+@when('we ask for the native PBO problem {problem_id:d} instance {instance:d} of dimension {dimension:d}')
+def step_implementation(context, problem_id, instance, dimension):
+    try:
+        problems.get_problem(problem_id, instance, dimension)
+        context.error = None
+    except ValueError as e:
+        context.error = e
+
+
+@then('a ValueError is raised')
+def step_implementation(context):
+    assert isinstance(context.error, ValueError)
@@ -1,6 +1,10 @@
 import feast.tree as tree
+from metaheuristics.tworate import TwoRateEa
 from behave import *
 import math
+import random
+
+import numpy as np
 
 
 @given('a recipe {recipe}')
@@ -30,3 +34,177 @@ def step_implementation(context, result):
 @then('it reports the correct height: {height:d}')
 def step_implementation(context, height):
     assert context.tree.height == height, f'{context.tree.height} is not equal to {height}'
+
+
+@then('the compiled tree evaluates to the same results')
+def step_implementation(context):
+    compiled = tree.compile(context.tree)
+    for rate, dimension, best_child_is_low in [(0, 16, True), (2, 16, False), (3.5, 100, True)]:
+        observables = {
+            'boolean': {'best_child_is_low': best_child_is_low},
+            'numeric': {'rate': rate, 'dimension': dimension}
+        }
+        random.seed(rate)
+        expected = context.tree.evaluate(observables)
+        random.seed(rate)
+        assert compiled(observables) == expected, f'{compiled(observables)} is not equal to {expected}'
+
+
+@then('the tree compiled against the two-rate schema evaluates to the same results')
+def step_implementation(context):
+    schema = TwoRateEa.observables_schema
+    compiled = tree.compile(context.tree, schema)
+    observables = schema.record()
+    for rate, dimension, best_child_is_low in [(0, 16, True), (2, 16, False), (3.5, 100, True)]:
+        observables.set('numeric', 'rate', rate)
+        observables.set('numeric', 'dimension', dimension)
+        observables.set('boolean', 'best_child_is_low', best_child_is_low)
+        random.seed(rate)
+        expected = context.tree.evaluate({
+            'boolean': {'best_child_is_low': best_child_is_low},
+            'numeric': {'rate': rate, 'dimension': dimension}
+        })
+        random.seed(rate)
+        assert compiled(observables) == expected, f'{compiled(observables)} is not equal to {expected}'
+        random.seed(rate)
+        assert context.tree.evaluate(observables) == expected
+
+
+@then('the batch evaluation agrees with the tree')
+def step_implementation(context):
+    rates = np.array([0, 0.5, 1, 2, 3.5, 8])
+    best_child_is_low = np.array([True, False, True, False, True, False])
+    results = context.tree.evaluate_batch({
+        'boolean': {'best_child_is_low': best_child_is_low},
+        'numeric': {'rate': rates, 'dimension': 16}
+    })
+    assert results.shape == rates.shape, f'{results.shape} is not equal to {rates.shape}'
+    for i in range(len(rates)):
+        expected = context.tree.evaluate({
+            'boolean': {'best_child_is_low': best_child_is_low[i]},
+            'numeric': {'rate': rates[i], 'dimension': 16}
+        })
+        assert math.isclose(results[i], expected), f'{results[i]} is not equal to {expected}'
+
+
+@then('inflating a tree from that recipe fails')
+def step_implementation(context):
+    try:
+        tree.create(context.recipe)
+    except ValueError:
+        return
+    assert False, f'{context.recipe} was inflated'
+
+
+@given('a chain of {depth:d} nested negations as recipe')
+def step_implementation(context, depth):
+    context.recipe = '|'.join(['numeric_unary:negative'] * depth + ['numeric_nullary:1'])
+
+
+@given('a chain of {depth:d} nested negations of {leaf} as recipe')
+def step_implementation(context, depth, leaf):
+    context.recipe = '|'.join(['numeric_unary:negative'] * depth + [leaf])
+
+
+@then('the tree serializes to that recipe')
+def step_implementation(context):
+    assert context.tree.serialize() == context.recipe
+
+
+@then('its canonical form serializes to {recipe}')
+def step_implementation(context, recipe):
+    canonical = tree.canonicalize(context.tree).serialize()
+    assert canonical == recipe, f'{canonical} is not equal to {recipe}'
+
+
+@then('the tree has {depth:d} negations on its left spine')
+def step_implementation(context, depth):
+    node = context.tree
+    for i in range(depth):
+        assert node.terminal == 'numeric_unary:negative', f'{node.terminal} at depth {i}'
+        node = node.children[0]
+    assert node.terminal == 'numeric_nullary:1'
+
+
+@when('we simplify that tree')
+def step_implementation(context):
+    context.simplified_tree = tree.simplify(context.tree)
+
+
+@when('we simplify {count:d} sums of distinct constants')
+def step_implementation(context, count):
+    context.sums = [(i + 0.25, tree.simplify(tree.create(f'numeric_binary:+|numeric_nullary:{i}|numeric_nullary:0.25')))
+                    for i in range(count)]
+
+
+@then('every sum folds to a constant of its value, while at most {maximum:d} terminals stay parsed')
+def step_implementation(context, maximum):
+    from feast.tree.base import MAX_PARSED_TERMINALS, PARSED_TERMINALS
+    for value, simplified_tree in context.sums:
+        assert simplified_tree.serialize() == f'numeric_nullary:{value!r}' and simplified_tree.evaluate() == value
+    assert MAX_PARSED_TERMINALS == maximum and len(PARSED_TERMINALS) <= maximum
+
+
+@then('the simplified tree serializes to {recipe}')
+def step_implementation(context, recipe):
+    assert context.simplified_tree.serialize() == recipe, f'{context.simplified_tree.serialize()} is not equal to {recipe}'
+
+
+@then('the tree is static: {static}')
+def step_implementation(context, static):
+    assert context.tree.is_static is (static == 'true')
+
+
+@given('another recipe {recipe}')
+def step_implementation(context, recipe):
+    context.other_recipe = recipe
+
+
+@then('both recipes have the same canonical form')
+def step_implementation(context):
+    canonical = tree.canonicalize(tree.create(context.recipe)).serialize()
+    other_canonical = tree.canonicalize(tree.create(context.other_recipe)).serialize()
+    assert canonical == other_canonical, f'{canonical} is not equal to {other_canonical}'
+
+
+@when('we replace the subtree at path {path} by {replacement}')
+def step_implementation(context, path, replacement):
+    context.path = () if path == 'root' else tuple(int(child_number) for child_number in path.split('.'))
+    context.edited_tree = context.tree.replace_subtree(context.path, tree.create(replacement))
+
+
+@then('the edited tree serializes to {recipe}')
+def step_implementation(context, recipe):
+    assert context.edited_tree.serialize() == recipe, f'{context.edited_tree.serialize()} is not equal to {recipe}'
+
+
+@then('the original tree is unchanged and shares the subtrees off the path')
+def step_implementation(context):
+    assert context.tree.serialize() == context.recipe
+    original, edited = context.tree, context.edited_tree
+    for child_number in context.path:
+        for other in range(original.arity):
+            if other != child_number:
+                assert edited.children[other] is original.children[other]
+        original, edited = original.children[child_number], edited.children[child_number]
+
+
+@then('it has {leaves:d} leaves and {numeric:d} numeric nodes')
+def step_implementation(context, leaves, numeric):
+    found_leaves = context.tree.nodes_where(lambda node: not node.arity)
+    assert len(found_leaves) == leaves, f'{len(found_leaves)} is not equal to {leaves}'
+    for path, node in found_leaves:
+        assert context.tree.subtree(path) is node
+    found_numeric = context.tree.nodes_where(lambda node: node.return_type == 'numeric')
+    assert len(found_numeric) == numeric, f'{len(found_numeric)} is not equal to {numeric}'
+
+
+@then('random nodes of each return type have that return type')
+def step_implementation(context):
+    for return_type in ['numeric', 'boolean']:
+        found = context.tree.random_node(return_type)
+        if not context.tree.nodes_where(lambda node: node.return_type == return_type):
+            assert found is None
+            continue
+        path, node = found
+        assert node.return_type == return_type and context.tree.subtree(path) is node
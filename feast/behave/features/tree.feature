@@ -38,3 +38,135 @@ Feature: Inflating and deflating trees
       | numeric_unary:negative\|numeric_nullary:2                                                           | 2      |
       | boolean_unary:not\|boolean_unary:not\|boolean_unary_num:truthy\|numeric_nullary:-1                  | 4      |
       | boolean_binary_num:<\|numeric_nullary:3\|numeric_binary:-\|numeric_nullary:0.5\|numeric_nullary:0.5 | 3      |
+
+  Scenario Outline: compiled trees evaluate like the trees they were compiled from
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    Then the compiled tree evaluates to the same results
+    Examples:
+      | recipe                                                                                                                                                      |
+      | numeric_nullary:1                                                                                                                                           |
+      | numeric_binary:/\|numeric_nullary_observable:rate\|numeric_nullary:0                                                                                        |
+      | numeric_binary:min\|numeric_nullary_observable:dimension\|numeric_binary:*\|numeric_nullary_random:uniform\|numeric_nullary_observable:rate                  |
+      | numeric_ternary:if\|boolean_nullary_observable:best_child_is_low\|numeric_unary:negative\|numeric_nullary:2\|numeric_nullary:0.5                            |
+      | boolean_binary:and\|boolean_nullary:false\|boolean_binary_num:<=\|numeric_nullary_random:uniform\|numeric_nullary:0.5                                      |
+      | boolean_ternary:if\|boolean_nullary_random:uniform\|boolean_unary:not\|boolean_nullary:true\|boolean_unary_num:truthy\|numeric_nullary_observable:rate        |
+
+  Scenario Outline: trees compiled against an observables schema read the record the heuristic updates
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    Then the tree compiled against the two-rate schema evaluates to the same results
+    Examples:
+      | recipe                                                                                                                                                      |
+      | numeric_binary:/\|numeric_nullary_observable:rate\|numeric_nullary:0                                                                                        |
+      | numeric_binary:min\|numeric_nullary_observable:dimension\|numeric_binary:*\|numeric_nullary_random:uniform\|numeric_nullary_observable:rate                  |
+      | numeric_ternary:if\|boolean_nullary_observable:best_child_is_low\|numeric_unary:negative\|numeric_nullary:2\|numeric_nullary:0.5                            |
+      | boolean_ternary:if\|boolean_nullary_random:uniform\|boolean_unary:not\|boolean_nullary:true\|boolean_unary_num:truthy\|numeric_nullary_observable:rate        |
+
+  Scenario Outline: batch evaluation agrees with evaluating each observable state separately
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    Then the batch evaluation agrees with the tree
+    Examples:
+      | recipe                                                                                                                                                |
+      | numeric_nullary:1                                                                                                                                     |
+      | numeric_binary:/\|numeric_nullary_observable:rate\|numeric_binary:-\|numeric_nullary_observable:rate\|numeric_nullary:1                               |
+      | numeric_binary:max\|numeric_nullary_observable:dimension\|numeric_binary:*\|numeric_nullary:3\|numeric_nullary_observable:rate                        |
+      | numeric_ternary:if\|boolean_nullary_observable:best_child_is_low\|numeric_unary:negative\|numeric_nullary_observable:rate\|numeric_nullary:0.5        |
+      | boolean_binary:or\|boolean_unary:not\|boolean_nullary_observable:best_child_is_low\|boolean_binary_num:>=\|numeric_nullary_observable:rate\|numeric_nullary:2 |
+      | boolean_ternary:if\|boolean_nullary:true\|boolean_unary_num:truthy\|numeric_nullary_observable:rate\|boolean_nullary:false                             |
+
+  Scenario Outline: incomplete or unknown recipes are rejected
+    Given a recipe <recipe>
+    Then inflating a tree from that recipe fails
+    Examples:
+      | recipe                                                |
+      | numeric_binary:+\|numeric_nullary:1                   |
+      | boolean_ternary:if\|boolean_nullary:true              |
+      | numeric_quaternary:if\|numeric_nullary:1              |
+      | numeric_binary:xor\|numeric_nullary:1\|numeric_nullary:0 |
+      | numeric_nullary:one                                   |
+
+  Scenario: very deep recipes are inflated without recursion
+    Given a chain of 5000 nested negations as recipe
+    When we inflate a tree from that recipe
+    Then the tree has 5000 negations on its left spine
+
+  Scenario Outline: very deep trees are serialized and canonicalized without recursion
+    Given a chain of <depth> nested negations of <leaf> as recipe
+    When we inflate a tree from that recipe
+    Then the tree serializes to that recipe
+    And its canonical form serializes to <canonical>
+    Examples:
+      | depth | leaf                            | canonical                                                             |
+      | 5000  | numeric_nullary:1               | numeric_nullary:1                                                     |
+      | 5001  | numeric_nullary_observable:rate | numeric_unary:negative\|numeric_nullary_observable:rate               |
+
+  Scenario Outline: simplification folds static subtrees and removes identities
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    And we simplify that tree
+    Then the simplified tree serializes to <simplified>
+    Examples:
+      | recipe                                                                                                             | simplified                                                                         |
+      | numeric_binary:*\|numeric_nullary_observable:rate\|numeric_nullary:1                                               | numeric_nullary_observable:rate                                                    |
+      | numeric_binary:+\|numeric_nullary:0\|numeric_nullary_observable:rate                                               | numeric_nullary_observable:rate                                                    |
+      | numeric_binary:/\|numeric_nullary_observable:dimension\|numeric_binary:+\|numeric_nullary:2\|numeric_nullary:2     | numeric_binary:/\|numeric_nullary_observable:dimension\|numeric_nullary:4          |
+      | numeric_ternary:if\|boolean_nullary:true\|numeric_nullary_observable:rate\|numeric_nullary:2                       | numeric_nullary_observable:rate                                                    |
+      | numeric_binary:max\|numeric_nullary_observable:rate\|numeric_nullary_observable:rate                               | numeric_nullary_observable:rate                                                    |
+      | numeric_binary:max\|numeric_nullary_random:uniform\|numeric_nullary_random:uniform                                 | numeric_binary:max\|numeric_nullary_random:uniform\|numeric_nullary_random:uniform |
+      | boolean_unary:not\|boolean_unary:not\|boolean_nullary_observable:best_child_is_low                                 | boolean_nullary_observable:best_child_is_low                                       |
+      | numeric_unary:negative\|numeric_unary:negative\|numeric_nullary_random:uniform                                     | numeric_nullary_random:uniform                                                     |
+      | boolean_binary:and\|boolean_nullary_random:uniform\|boolean_unary_num:truthy\|numeric_nullary:0                    | boolean_nullary:false                                                              |
+      | numeric_binary:/\|numeric_nullary:1\|numeric_binary:-\|numeric_nullary:0.5\|numeric_nullary:0.5                    | numeric_nullary:0                                                                  |
+      | numeric_binary:*\|numeric_nullary:0.5\|numeric_nullary:0.25                                                        | numeric_nullary:0.125                                                              |
+
+  Scenario: folded constants don't grow the table of parsed terminals without bound
+    When we simplify 10000 sums of distinct constants
+    Then every sum folds to a constant of its value, while at most 4096 terminals stay parsed
+
+  Scenario Outline: only constant leaves are static
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    Then the tree is static: <static>
+    Examples:
+      | recipe                                                                  | static |
+      | numeric_nullary:1                                                       | true   |
+      | numeric_nullary_observable:rate                                         | false  |
+      | numeric_binary:+\|numeric_nullary:1\|numeric_nullary_random:uniform     | false  |
+      | boolean_unary:not\|boolean_nullary_observable:best_child_is_low         | false  |
+      | boolean_unary_num:truthy\|numeric_nullary:2                             | true   |
+
+  Scenario Outline: equivalent trees have the same canonical form
+    Given a recipe <recipe>
+    And another recipe <other>
+    Then both recipes have the same canonical form
+    Examples:
+      | recipe                                                                                           | other                                                                                            |
+      | numeric_binary:+\|numeric_nullary_observable:rate\|numeric_nullary_observable:dimension          | numeric_binary:+\|numeric_nullary_observable:dimension\|numeric_nullary_observable:rate          |
+      | numeric_binary:min\|numeric_nullary:2\|numeric_nullary_observable:rate                           | numeric_binary:min\|numeric_nullary_observable:rate\|numeric_nullary:2                           |
+      | boolean_binary_num:>\|numeric_nullary_observable:rate\|numeric_nullary:2                         | boolean_binary_num:<\|numeric_nullary:2\|numeric_nullary_observable:rate                         |
+      | numeric_binary:*\|numeric_nullary:1\|numeric_binary:max\|numeric_nullary:2\|numeric_nullary_observable:rate | numeric_binary:max\|numeric_nullary_observable:rate\|numeric_nullary:2                 |
+
+  Scenario Outline: replacing a subtree by path shares everything off the path
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    And we replace the subtree at path <path> by <replacement>
+    Then the edited tree serializes to <result>
+    And the original tree is unchanged and shares the subtrees off the path
+    Examples:
+      | recipe                                                                                          | path | replacement                                 | result                                                                                                     |
+      | numeric_binary:+\|numeric_nullary:1\|numeric_nullary:2                                          | root | numeric_nullary:3                           | numeric_nullary:3                                                                                          |
+      | numeric_binary:+\|numeric_nullary:1\|numeric_nullary:2                                          | 0    | numeric_unary:negative\|numeric_nullary:5   | numeric_binary:+\|numeric_unary:negative\|numeric_nullary:5\|numeric_nullary:2                             |
+      | numeric_binary:+\|numeric_binary:*\|numeric_nullary:1\|numeric_nullary:4\|numeric_nullary:2     | 0.1  | numeric_nullary_observable:rate             | numeric_binary:+\|numeric_binary:*\|numeric_nullary:1\|numeric_nullary_observable:rate\|numeric_nullary:2  |
+
+  Scenario Outline: nodes are found by predicate and picked at random by return type
+    Given a recipe <recipe>
+    When we inflate a tree from that recipe
+    Then it has <leaves> leaves and <numeric> numeric nodes
+    And random nodes of each return type have that return type
+    Examples:
+      | recipe                                                                                                                                                      | leaves | numeric |
+      | numeric_nullary:1                                                                                                                                           | 1      | 1       |
+      | numeric_ternary:if\|boolean_nullary_observable:best_child_is_low\|numeric_unary:negative\|numeric_nullary:2\|numeric_nullary:0.5                            | 3      | 4       |
+      | boolean_ternary:if\|boolean_nullary_random:uniform\|boolean_unary:not\|boolean_nullary:true\|boolean_unary_num:truthy\|numeric_nullary_observable:rate        | 3      | 1       |
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Union
+
+from ioh import ProblemType
+
+# Version of the trial scores produced by the inner heuristics, part of every key. Bump it whenever a change to
+# the inner heuristics changes their scores, so scores cached by older versions no longer match.
+# 1: TwoRateEa applies the rate proposed by the adaptation formula
+SCORES_VERSION = 1
+
+
+class EvaluationKey(NamedTuple):
+    problem_id: int
+    instance: int
+    dimension: int
+    inner_budget: int
+    child_pop_size: int
+    version: int
+    trials: int
+    phenotype: str
+
+
+class EvaluationContext(NamedTuple):
+    # Everything besides the phenotype and the number of trials that determines the trial scores
+    problem_id: int
+    instance: int
+    dimension: int
+    inner_budget: int
+    child_pop_size: int
+    version: int = SCORES_VERSION
+
+    @classmethod
+    def from_problem(cls, problem: ProblemType, inner_budget: int, child_pop_size: int) -> 'EvaluationContext':
+        meta_data = problem.meta_data
+        return cls(meta_data.problem_id, meta_data.instance, meta_data.n_variables, inner_budget, child_pop_size)
+
+    def key(self, trials: int, phenotype: str) -> EvaluationKey:
+        return EvaluationKey(*self, trials, phenotype)
+
+
+class EvaluationCache(ABC):
+    # Trial scores of phenotypes, kept across runs and experiments
+
+    @abstractmethod
+    def get(self, key: EvaluationKey) -> Union[List[float], None]:
+        pass
+
+    @abstractmethod
+    def put(self, key: EvaluationKey, scores: List[float]) -> None:
+        pass
+
+
+class MemoryEvaluationCache(EvaluationCache):
+    def __init__(self):
+        self.scores = {}
+
+    def get(self, key: EvaluationKey) -> Union[List[float], None]:
+        return self.scores.get(key)
+
+    def put(self, key: EvaluationKey, scores: List[float]) -> None:
+        self.scores[key] = list(scores)
+
+
+class SqliteEvaluationCache(EvaluationCache):
+    # Safe to share between processes: every process opens its own connection, and the database is in WAL
+    # mode, so readers don't block the writer and writers wait for each other instead of failing.
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        self.timeout = timeout
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # Databases written before keys had a version keep their scores in the table evaluations, which is
+            # no longer read
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS versioned_evaluations ('
+                'problem_id INTEGER, instance INTEGER, dimension INTEGER, inner_budget INTEGER, '
+                'child_pop_size INTEGER, version INTEGER, trials INTEGER, phenotype TEXT, scores TEXT, '
+                'PRIMARY KEY (problem_id, instance, dimension, inner_budget, child_pop_size, version, trials, '
+                'phenotype))'
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: EvaluationKey) -> Union[List[float], None]:
+        row = self.connection.execute(
+            'SELECT scores FROM versioned_evaluations WHERE problem_id = ? AND instance = ? AND dimension = ? '
+            'AND inner_budget = ? AND child_pop_size = ? AND version = ? AND trials = ? AND phenotype = ?',
+            tuple(key)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: EvaluationKey, scores: List[float]) -> None:
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO versioned_evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                tuple(key) + (json.dumps([float(score) for score in scores]),)
+            )
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
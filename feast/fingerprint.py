@@ -0,0 +1,61 @@
+import hashlib
+
+import numpy as np
+
+
+# 64-bit fingerprints stand in for long keys, like genomes, in uniqueness checks. Two different keys share a
+# fingerprint with a probability of about 2^-64, which we accept.
+
+def fingerprint(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def fingerprint_array(array: np.ndarray) -> int:
+    return fingerprint(np.ascontiguousarray(array).tobytes())
+
+
+class FingerprintSet:
+    # Open addressing over a uint64 array, so each fingerprint takes 8 bytes of table instead of a Python int
+    # in a set. Zero marks an empty slot, so the fingerprint zero is stored as one.
+    def __init__(self, capacity: int = 1024):
+        size = 1
+        while size < 2 * capacity:
+            size *= 2
+        self.table = np.zeros(size, dtype=np.uint64)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, key: int) -> bool:
+        return self.table[self._find(key or 1)] != 0
+
+    def add(self, key: int) -> bool:
+        # Returns whether the key was new
+        key = key or 1
+        slot = self._find(key)
+        if self.table[slot] != 0:
+            return False
+        self.table[slot] = key
+        self.size += 1
+        if 2 * self.size > len(self.table):
+            self._grow()
+        return True
+
+    def _find(self, key: int) -> int:
+        # The slot holding the key, or the empty slot where it would go
+        mask = len(self.table) - 1
+        slot = key & mask
+        table = self.table
+        while True:
+            stored = int(table[slot])
+            if stored == 0 or stored == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        keys = self.table[self.table != 0]
+        self.table = np.zeros(2 * len(self.table), dtype=np.uint64)
+        self.size = 0
+        for key in keys.tolist():
+            self.add(key)
@@ -1,7 +1,30 @@
+import bisect
+import itertools
 import json
+import math
 import random
 from typing import Union, List, Tuple
 
+import numpy as np
+
+
+class GenomeDerivation:
+    # The terminals derived from a genome, with a checkpoint before every step: the non-terminals still to be
+    # expanded and the number of terminals derived so far. Stacks are linked (symbol, rest) pairs with the
+    # leftmost non-terminal on top, so checkpoints share their tails instead of copying them.
+    __slots__ = ('terminals', 'stacks', 'terminal_counts', 'stack', 'coding_length')
+
+    def __init__(self, terminals: List[int], stacks: list, terminal_counts: List[int], stack: tuple):
+        self.terminals = terminals
+        self.stacks = stacks
+        self.terminal_counts = terminal_counts
+        self.stack = stack  # what is left after the last step
+        self.coding_length = None
+
+    @property
+    def complete(self) -> bool:
+        return self.stack is None
+
 
 class Grammar:
     def __init__(self, wraparound: int = 0, grammar_definition: str = 'feast/grammar/mixed.json'):
@@ -11,18 +34,176 @@ class Grammar:
         self.reductions = self._prepare_reductions()
         self._terminals = set()
         self._non_terminals = set()
+        self._compile()
 
     def __repr__(self) -> str:
         return json.dumps(self.productions, sort_keys=False, indent=2)
 
-    def produce_random_sentence(self, starting_symbol: str, soft_limit: int = 10, minimum_length: int = 0) -> str:
+    def _compile(self):
+        # Integer form of the productions for the derivation loops. Symbols get ids, and every production of a
+        # non-terminal is split into the ids of its terminals, in order, and of its non-terminals, reversed
+        # for the derivation stack.
+        self.symbols = list(self.productions.keys())
+        for rules in self.productions.values():
+            for rule in rules:
+                for symbol in rule:
+                    if symbol not in self.productions and symbol not in self.symbols:
+                        self.symbols.append(symbol)
+        self.symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(self.symbols)}
+        self.is_non_terminal = [symbol in self.productions for symbol in self.symbols]
+
+        self.production_table = [()] * len(self.symbols)
+        self.production_symbols = [()] * len(self.symbols)  # the ids in order, for enumeration
+        self.growing_productions = [None] * len(self.symbols)
+        for non_terminal, rules in self.productions.items():
+            table = []
+            for rule in rules:
+                ids = [self.symbol_ids[symbol] for symbol in rule]
+                table.append((
+                    tuple(i for i in ids if not self.is_non_terminal[i]),
+                    tuple(i for i in reversed(ids) if self.is_non_terminal[i])
+                ))
+            self.production_table[self.symbol_ids[non_terminal]] = tuple(table)
+            self.production_symbols[self.symbol_ids[non_terminal]] = tuple(
+                tuple(self.symbol_ids[symbol] for symbol in rule) for rule in rules)
+            # Productions that don't end the subtree with a single nullary operator, if any of them do
+            growing = tuple(index for index, rule in enumerate(rules)
+                            if rule not in [['NUM_NULLARY_OPERATOR'], ['BOOL_NULLARY_OPERATOR']])
+            if len(growing) < len(rules):
+                self.growing_productions[self.symbol_ids[non_terminal]] = growing
+
+        # Type non-terminals and the production that replaces theirs once the size limit is triggered
+        self.limited_productions = {}
+        for type_non_terminal in ['NUM', 'BOOL']:
+            if type_non_terminal in self.productions:
+                nullary = self.symbol_ids[f'{type_non_terminal}_NULLARY_OPERATOR']
+                self.limited_productions[self.symbol_ids[type_non_terminal]] = ((), (nullary,))
+
+        self.alternative_terminals = {}
+        for terminal, non_terminal in self.reductions.items():
+            self.alternative_terminals[terminal] = tuple(
+                rule[0] for rule in self.productions[non_terminal] if terminal not in rule)
+
+        # Most terminals every symbol and production can derive, for the sized generator
+        self.maximum_sizes = self._count_maximum_sizes()
+        self.maximum_production_sizes = [()] * len(self.symbols)
+        for non_terminal, rules in self.productions.items():
+            self.maximum_production_sizes[self.symbol_ids[non_terminal]] = tuple(
+                sum(self.maximum_sizes[self.symbol_ids[symbol]] for symbol in rule) for rule in rules)
+        self._slot_costs = {}
+        self._sentence_counts = {}
+
+        # Non-terminal and production index deriving every terminal, for non-terminals deriving single terminals
+        self.terminal_productions = {}
+        for non_terminal, rules in self.productions.items():
+            if all(len(rule) == 1 and rule[0] not in self.productions for rule in rules):
+                for index, rule in enumerate(rules):
+                    self.terminal_productions[rule[0]] = (self.symbol_ids[non_terminal], index)
+
+    def _count_maximum_sizes(self) -> list:
+        # Most terminals in derivations from every symbol, infinite for symbols that grow through recursion
+        sizes = [0 if self.is_non_terminal[symbol] else 1 for symbol in range(len(self.symbols))]
+
+        def update() -> set:
+            changed = set()
+            for non_terminal, rules in self.productions.items():
+                symbol = self.symbol_ids[non_terminal]
+                size = max(sum(sizes[self.symbol_ids[rule_symbol]] for rule_symbol in rule) for rule in rules)
+                if size != sizes[symbol]:
+                    sizes[symbol] = size
+                    changed.add(symbol)
+            return changed
+
+        for _ in range(len(self.symbols) + 1):
+            changed = update()
+            if not changed:
+                return sizes
+        # Still growing after every symbol had its chance to contribute, so these grow through recursion
+        for symbol in changed:
+            sizes[symbol] = math.inf
+        while update():
+            pass
+        return sizes
+
+    def _get_slot_costs(self, slots: Tuple[int, ...], needed: Tuple[int, ...]) -> Tuple[list, list]:
+        # Fewest terminals in a derivation from every symbol that contains at least a number of every slot
+        # non-terminal, for every vector of numbers up to the needed ones. Without slots this is just the minimum
+        # size of every symbol. Also returns, for every non-terminal and vector, the productions with their most
+        # terminals and every way to split the vector among their children, ordered by fewest terminals.
+        key = slots, needed
+        if key in self._slot_costs:
+            return self._slot_costs[key]
+        vectors = list(itertools.product(*(range(count + 1) for count in needed)))
+        zero = vectors[0]
+        costs = [dict.fromkeys(vectors, math.inf) for _ in self.symbols]
+        for symbol in range(len(self.symbols)):
+            if not self.is_non_terminal[symbol]:
+                costs[symbol][zero] = 1
+
+        def remaining(symbol: int, vector: tuple) -> tuple:
+            # Slots a non-terminal still needs from its production, after counting itself
+            return tuple(max(count - 1, 0) if slot == symbol else count for slot, count in zip(slots, vector))
+
+        def splits(children: tuple, vector: tuple):
+            if len(children) <= 1:
+                if children or vector == zero:
+                    yield (vector,) * len(children)
+                return
+            for part in itertools.product(*(range(count + 1) for count in vector)):
+                rest = tuple(count - taken for count, taken in zip(vector, part))
+                for split in splits(children[1:], rest):
+                    yield (part,) + split
+
+        def split_costs(symbol: int, vector: tuple) -> list:
+            # (index, most terminals, fewest terminals, split) of the productions of a non-terminal
+            entries = []
+            for index, (terminal_ids, non_terminal_ids) in enumerate(self.production_table[symbol]):
+                for split in splits(non_terminal_ids, remaining(symbol, vector)):
+                    cost = len(terminal_ids) + sum(costs[child][part] for child, part in zip(non_terminal_ids, split))
+                    if cost != math.inf:
+                        entries.append((index, self.maximum_production_sizes[symbol][index], cost, split))
+            return entries
+
+        changed = True
+        while changed:
+            changed = False
+            for non_terminal in self.productions:
+                symbol = self.symbol_ids[non_terminal]
+                for vector in vectors:
+                    cost = min([entry[2] for entry in split_costs(symbol, vector)], default=math.inf)
+                    if cost < costs[symbol][vector]:
+                        costs[symbol][vector] = cost
+                        changed = True
+
+        options = [None] * len(self.symbols)
+        for non_terminal in self.productions:
+            symbol = self.symbol_ids[non_terminal]
+            options[symbol] = {}
+            for vector in vectors:
+                by_production = {}
+                for index, most, cost, split in sorted(split_costs(symbol, vector), key=lambda entry: entry[2]):
+                    by_production.setdefault((index, most), ([], []))
+                    by_production[index, most][0].append(cost)
+                    by_production[index, most][1].append(split)
+                options[symbol][vector] = tuple((index, most, tuple(entry_costs), tuple(entry_splits))
+                                                for (index, most), (entry_costs, entry_splits) in by_production.items())
+        self._slot_costs[key] = costs, options
+        return costs, options
+
+    def produce_random_sentence(self, starting_symbol: str, soft_limit: int = 10, minimum_length: int = 0,
+                                rng: random.Random = None) -> str:
+        # Random choices come from rng if given, from the random module otherwise, like in the other generators
         if starting_symbol not in ['BOOL', 'NUM']:
             raise ValueError(f"starting symbol {starting_symbol}")
+        rng = random if rng is None else rng
+        production_table = self.production_table
+        growing_productions = self.growing_productions
+        limited_productions = self.limited_productions
         terminals = []
-        non_terminals = [starting_symbol]
+        non_terminals = [self.symbol_ids[starting_symbol]]  # a stack, the leftmost non-terminal on top
 
-        while len(non_terminals):
-            symbol = non_terminals[0]
+        while non_terminals:
+            symbol = non_terminals[-1]
 
             # Detect when we're making an overly large tree
             # We're allowed to duck over and under the limit for non-terminals, to reduce bias to left-large trees
@@ -31,21 +212,221 @@ class Grammar:
             if len(terminals) > soft_limit * 10:
                 limit_triggered = True
 
-            options = self.productions[symbol]
-            choice = options[random.randint(0, len(options) - 1)]
-
-            if len(terminals) < minimum_length and choice in ['NUM_NULLARY_OPERATOR', 'BOOL_NULLARY_OPERATOR']:
-                continue  # try again
+            options = production_table[symbol]
+            if len(terminals) < minimum_length and growing_productions[symbol] is not None:
+                # Too short to end the subtree here
+                growing = growing_productions[symbol]
+                index = growing[rng.randint(0, len(growing) - 1)]
+            else:
+                index = rng.randint(0, len(options) - 1)
 
             # If the limit was triggered and we're decoding a type-nonterminal,
             # override the choice with a nullary arity-nonterminal
-            if limit_triggered and symbol == 'NUM':
-                choice = ['NUM_NULLARY_OPERATOR']
-            if limit_triggered and symbol == 'BOOL':
-                choice = ['BOOL_NULLARY_OPERATOR']
+            choice = options[index]
+            if limit_triggered and symbol in limited_productions:
+                choice = limited_productions[symbol]
+
+            non_terminals.pop()
+            terminals.extend(choice[0])
+            non_terminals.extend(choice[1])
+        symbols = self.symbols
+        return '|'.join([symbols[terminal] for terminal in terminals])
 
-            non_terminals, terminals = self._produce(choice, non_terminals, terminals)
-        return '|'.join(terminals)
+    def produce_ramped_sentence(self, starting_symbol: str, minimum_size: int, maximum_size: int,
+                                required_terminals: List[str] = (), rng: random.Random = None) -> str:
+        sentence, _ = self.produce_ramped_derivation(starting_symbol, minimum_size, maximum_size, required_terminals,
+                                                     rng)
+        return sentence
+
+    def produce_ramped_derivation(self, starting_symbol: str, minimum_size: int, maximum_size: int,
+                                  required_terminals: List[str] = (), rng: random.Random = None) -> Tuple[str, list]:
+        # Ramped half-and-half over sizes: a target size is drawn from the range, and half of the sentences
+        # have exactly that many terminals (full) while the other half have at most that many (grow)
+        rng = random if rng is None else rng
+        size = rng.randint(minimum_size, maximum_size)
+        if rng.random() < 0.5:
+            return self.produce_sized_derivation(starting_symbol, size, size, required_terminals, rng)
+        return self.produce_sized_derivation(starting_symbol, minimum_size, size, required_terminals, rng)
+
+    def produce_sized_derivation(self, starting_symbol: str, minimum_size: int = 1, maximum_size: float = math.inf,
+                                 required_terminals: List[str] = (), rng: random.Random = None) -> Tuple[str, list]:
+        # Derives a sentence with a number of terminals in the range that contains all required terminals,
+        # without rejection. Every required terminal needs a slot, an occurrence of the non-terminal deriving it,
+        # and every pending non-terminal carries the number of slots its subtree has to contain. Each step picks
+        # uniformly among the productions, and ways to split the slots among their children, that can still meet
+        # the size bounds, and the required terminals finally replace the terminals of randomly picked slots.
+        # Returns the sentence and the (non-terminal, production index) chosen at each step, in the order
+        # _produce_from_genome reads codons. A maximum size too small for the required terminals is exceeded.
+        if starting_symbol not in ['BOOL', 'NUM']:
+            raise ValueError(f"starting symbol {starting_symbol}")
+        rng = random if rng is None else rng
+        for terminal in required_terminals:
+            if terminal not in self.terminal_productions:
+                raise ValueError(f"Cannot require {terminal}")
+        required_slots = [self.terminal_productions[terminal][0] for terminal in required_terminals]
+        slots = tuple(sorted(set(required_slots)))
+        needed = tuple(required_slots.count(slot) for slot in slots)
+        costs, options = self._get_slot_costs(slots, needed)
+        start = self.symbol_ids[starting_symbol]
+        if costs[start][needed] == math.inf:
+            raise ValueError(f"Cannot derive {required_terminals} from {starting_symbol}")
+
+        production_table = self.production_table
+        maximum_sizes = self.maximum_sizes
+        terminals = []
+        choices = []
+        slot_steps = {slot: [] for slot in slots}
+        non_terminals = [(start, needed)]  # a stack, the leftmost non-terminal on top
+        # Fewest terminals the pending non-terminals derive, and most, split into a finite sum and a number of
+        # non-terminals without a maximum
+        pending_minimum = costs[start][needed]
+        pending_maximum = 0 if maximum_sizes[start] == math.inf else maximum_sizes[start]
+        pending_unbounded = int(maximum_sizes[start] == math.inf)
+
+        while non_terminals:
+            symbol, need = non_terminals.pop()
+            pending_minimum -= costs[symbol][need]
+            if maximum_sizes[symbol] == math.inf:
+                pending_unbounded -= 1
+            else:
+                pending_maximum -= maximum_sizes[symbol]
+            if symbol in slot_steps:
+                slot_steps[symbol].append((len(choices), len(terminals)))
+
+            budget = maximum_size - len(terminals) - pending_minimum
+            fitting = []
+            smallest = None
+            for option in options[symbol][need]:
+                index, most, split_costs, splits = option
+                if not pending_unbounded and len(terminals) + most + pending_maximum < minimum_size:
+                    continue
+                count = bisect.bisect_right(split_costs, budget)
+                if count:
+                    fitting.append((index, splits, count))
+                if smallest is None or split_costs[0] < smallest[2][0]:
+                    smallest = option
+            if fitting:
+                index, splits, count = fitting[rng.randint(0, len(fitting) - 1)]
+                split = splits[rng.randint(0, count - 1)]
+            elif smallest is not None:
+                # Over the maximum size anyway, so stay as small as possible
+                index, split = smallest[0], smallest[3][0]
+            else:
+                raise ValueError(f"Cannot derive {minimum_size} terminals from {starting_symbol}")
+
+            choices.append((symbol, index))
+            production_terminals, children = production_table[symbol][index]
+            terminals.extend(production_terminals)
+            for child, part in zip(children, split):
+                non_terminals.append((child, part))
+                pending_minimum += costs[child][part]
+                if maximum_sizes[child] == math.inf:
+                    pending_unbounded += 1
+                else:
+                    pending_maximum += maximum_sizes[child]
+
+        for slot in slots:
+            required = [terminal for terminal in required_terminals if self.terminal_productions[terminal][0] == slot]
+            for terminal, (step, position) in zip(required, rng.sample(slot_steps[slot], len(required))):
+                terminals[position] = self.symbol_ids[terminal]
+                choices[step] = self.terminal_productions[terminal]
+
+        symbols = self.symbols
+        return '|'.join([symbols[terminal] for terminal in terminals]), choices
+
+    def encode_genome(self, choices: list, genome_length: int, codon_size: int, rng: np.random.Generator,
+                      dtype=np.int32) -> np.ndarray:
+        # A genome that maps to the derivation with these choices: every codon picks its production modulo the
+        # number of productions, and the codons after the derivation are random
+        if len(choices) > genome_length:
+            raise ValueError(f"A derivation of {len(choices)} steps doesn't fit a genome of length {genome_length}")
+        genome = rng.integers(0, codon_size, genome_length, dtype=dtype)
+        if choices:
+            counts = np.array([len(self.production_table[symbol]) for symbol, _ in choices])
+            indices = np.array([index for _, index in choices])
+            multiples = np.floor(rng.random(len(choices)) * ((codon_size - 1 - indices) // counts + 1))
+            genome[:len(choices)] = indices + counts * multiples.astype(int)
+        return genome
+
+    def enumerate_sentences(self, starting_symbol: str, minimum_size: int = 1, maximum_size: int = None,
+                            shuffle: bool = False, rng: random.Random = None):
+        # Every sentence once, by increasing number of terminals. Sentences of a size are numbered by their
+        # derivation, so the n-th one is derived from the counts of sentences of every symbol and size instead of
+        # being stored. Shuffling visits the numbers of every size in a uniformly random order.
+        if starting_symbol not in ['BOOL', 'NUM']:
+            raise ValueError(f"starting symbol {starting_symbol}")
+        rng = random if rng is None else rng
+        start = self.symbol_ids[starting_symbol]
+        symbols = self.symbols
+        size = minimum_size
+        while (maximum_size is None or size <= maximum_size) and size <= self.maximum_sizes[start]:
+            count = self.count_sentences(starting_symbol, size)
+            for number in self._random_order(count, rng) if shuffle else range(count):
+                terminals = []
+                self._unrank(start, size, number, terminals)
+                yield '|'.join([symbols[terminal] for terminal in terminals])
+            size += 1
+
+    @staticmethod
+    def _random_order(count: int, rng: random.Random):
+        # Numbers below count, each once, in a uniformly random order. They're drawn lazily, redrawing those
+        # drawn before, until half of them are drawn, after which the rest are shuffled. Memory grows with the
+        # numbers drawn, so enumerating a few sentences of a size with millions of them stays cheap.
+        drawn = set()
+        while 2 * len(drawn) < count:
+            number = rng.randrange(count)
+            if number not in drawn:
+                drawn.add(number)
+                yield number
+        rest = [number for number in range(count) if number not in drawn]
+        rng.shuffle(rest)
+        yield from rest
+
+    def count_sentences(self, starting_symbol: str, size: int) -> int:
+        return self._count_sentences((self.symbol_ids[starting_symbol],), size)
+
+    def _count_sentences(self, sequence: Tuple[int, ...], size: int) -> int:
+        # Number of sentences of the given size derived from a sequence of symbols
+        key = sequence, size
+        if key in self._sentence_counts:
+            return self._sentence_counts[key]
+        if size < len(sequence):
+            count = 0  # every symbol derives at least one terminal
+        elif len(sequence) > 1:
+            count = sum(self._count_sentences(sequence[:1], first) * self._count_sentences(sequence[1:], size - first)
+                        for first in range(1, size - len(sequence) + 2))
+        elif self.is_non_terminal[sequence[0]]:
+            count = sum(self._count_sentences(rule, size) for rule in self.production_symbols[sequence[0]])
+        else:
+            count = int(size == 1)
+        self._sentence_counts[key] = count
+        return count
+
+    def _unrank(self, symbol: int, size: int, number: int, terminals: List[int]):
+        # Appends the terminals of the sentence with this number among the sentences of the size from the symbol
+        if not self.is_non_terminal[symbol]:
+            terminals.append(symbol)
+            return
+        for rule in self.production_symbols[symbol]:
+            count = self._count_sentences(rule, size)
+            if number < count:
+                self._unrank_sequence(rule, size, number, terminals)
+                return
+            number -= count
+
+    def _unrank_sequence(self, sequence: Tuple[int, ...], size: int, number: int, terminals: List[int]):
+        if len(sequence) == 1:
+            self._unrank(sequence[0], size, number, terminals)
+            return
+        for first in range(1, size - len(sequence) + 2):
+            rest_count = self._count_sentences(sequence[1:], size - first)
+            count = self._count_sentences(sequence[:1], first) * rest_count
+            if number < count:
+                first_number, rest_number = divmod(number, rest_count)
+                self._unrank(sequence[0], first, first_number, terminals)
+                self._unrank_sequence(sequence[1:], size - first, rest_number, terminals)
+                return
+            number -= count
 
     def get_genome_coding_length(self, genome: List[int], starting_symbol: str) -> int:
         _, coding_length = self._produce_from_genome(genome, starting_symbol=starting_symbol)
@@ -58,13 +439,17 @@ class Grammar:
     def _produce_from_genome(self, genome: List[int], starting_symbol: str) -> Tuple[str, int]:
         if starting_symbol not in ['BOOL', 'NUM']:
             raise ValueError
+        if isinstance(genome, np.ndarray):
+            genome = genome.tolist()  # Python ints index and divide much faster than NumPy scalars
+        production_table = self.production_table
         terminals = []
-        non_terminals = [starting_symbol]
+        non_terminals = [self.symbol_ids[starting_symbol]]  # a stack, the leftmost non-terminal on top
         gene = 0
         wraps = 0
+        genome_length = len(genome)
 
-        while len(non_terminals):
-            if gene >= len(genome):
+        while non_terminals:
+            if gene >= genome_length:
                 if (
                     self.wraparound == 0  # no wrap
                     or (0 < self.wraparound <= wraps)  # exhausted wraps
@@ -72,31 +457,75 @@ class Grammar:
                     break
                 gene = 0
                 wraps += 1
-            symbol = non_terminals[0]
-            options = self.productions[symbol]
-            index = genome[gene] % len(options)
-            choice = options[index]  # map gene to production
-            non_terminals, terminals = self._produce(choice, non_terminals, terminals)
+            options = production_table[non_terminals.pop()]
+            choice = options[genome[gene] % len(options)]  # map gene to production
+            terminals.extend(choice[0])
+            non_terminals.extend(choice[1])
             gene += 1
 
-        sentence = '|'.join(terminals)
-        if len(non_terminals):
+        symbols = self.symbols
+        sentence = '|'.join([symbols[terminal] for terminal in terminals])
+        if non_terminals:
             raise ValueError(f"Cannot finish derivation. So far: {sentence}")
 
-        coding_length = len(genome) if wraps else gene
+        coding_length = genome_length if wraps else gene
         return sentence, coding_length
 
-    def _produce(self, choice: List[str], non_terminals: List[str], terminals: List[str]) -> Tuple[list, list]:
-        new_terminals = []
-        new_non_terminals = []
-        for s in choice:
-            if s in self.productions.keys():
-                new_non_terminals.append(s)
-            else:
-                new_terminals.append(s)
-        terminals = terminals + new_terminals
-        non_terminals = new_non_terminals + non_terminals[1:]
-        return non_terminals, terminals
+    def derive_from_genome(self, genome: List[int], starting_symbol: str, parent: 'GenomeDerivation' = None,
+                           changed_from: int = 0) -> 'GenomeDerivation':
+        # Like _produce_from_genome, keeping checkpoints. With the derivation of a parent genome of the same
+        # length, that only differs from this genome from codon changed_from on, the derivation resumes from
+        # the parent's checkpoint at that codon.
+        if starting_symbol not in ['BOOL', 'NUM']:
+            raise ValueError
+        if isinstance(genome, np.ndarray):
+            genome = genome.tolist()
+        genome_length = len(genome)
+        if self.wraparound == 0:  # no wrap
+            maximum_steps = genome_length
+        elif self.wraparound > 0:
+            maximum_steps = genome_length * (self.wraparound + 1)
+        else:  # unlimited wraps
+            maximum_steps = math.inf if genome_length else 0
+
+        if parent is None:
+            step = 0
+            stack = (self.symbol_ids[starting_symbol], None)
+            terminals = []
+            stacks = []
+            terminal_counts = []
+        elif changed_from >= len(parent.stacks):  # the derivation never reads the changed codons
+            return parent
+        else:
+            step = changed_from
+            stacks = parent.stacks[:step]
+            terminal_counts = parent.terminal_counts[:step]
+            stack = parent.stacks[step]
+            terminals = parent.terminals[:parent.terminal_counts[step]]
+
+        production_table = self.production_table
+        add_stack = stacks.append
+        add_terminal_count = terminal_counts.append
+        add_terminals = terminals.extend
+        while stack is not None and step < maximum_steps:
+            if step < genome_length:  # changed codons are never wrapped ones, so later steps need no checkpoint
+                add_stack(stack)
+                add_terminal_count(len(terminals))
+            symbol, stack = stack
+            options = production_table[symbol]
+            choice = options[genome[step % genome_length] % len(options)]  # map gene to production
+            add_terminals(choice[0])
+            for non_terminal in choice[1]:
+                stack = (non_terminal, stack)
+            step += 1
+
+        derivation = GenomeDerivation(terminals, stacks, terminal_counts, stack)
+        derivation.coding_length = genome_length if step > genome_length else step
+        return derivation
+
+    def get_derived_sentence(self, derivation: 'GenomeDerivation') -> str:
+        symbols = self.symbols
+        return '|'.join([symbols[terminal] for terminal in derivation.terminals])
 
     @property
     def terminals(self) -> List[str]:
@@ -116,13 +545,11 @@ class Grammar:
             self._non_terminals = set(self.productions.keys())
         return list(self._non_terminals)
 
-    def get_alternative_terminal(self, terminal: str) -> Union[str, None]:
-        non_terminal = self.reductions[terminal]
-        alternatives = [rule for rule in self.productions[non_terminal] if terminal not in rule]
+    def get_alternative_terminal(self, terminal: str, rng: random.Random = None) -> Union[str, None]:
+        alternatives = self.alternative_terminals[terminal]
         if len(alternatives) == 0:
             return None
-        choice = random.randint(0, len(alternatives) - 1)
-        return alternatives[choice][0]
+        return alternatives[(random if rng is None else rng).randint(0, len(alternatives) - 1)]
 
     def _prepare_reductions(self) -> dict:
         reductions = {}
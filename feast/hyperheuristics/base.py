@@ -1,13 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, List, Tuple
 
 import numpy as np
+import queue
 import random
+import threading
 
 from ioh import ProblemType
 
+from feast.cache import EvaluationCache, EvaluationContext
 from feast.grammar import Grammar
+from feast.hyperheuristics.fidelity import SuccessiveHalving
+from feast.hyperheuristics.parallel import ProblemSpec, run_lockstep_trials, run_trial, run_trial_in_worker
+from feast.hyperheuristics.racing import Racing
+from feast.hyperheuristics.signature import BehaviouralSignature, SignatureCache, get_default_probes
 import feast.tree as tree
+from metaheuristics.observables import ObservablesSchema
 
 
 class HyperHeuristic(ABC):
@@ -23,7 +32,23 @@ class HyperHeuristic(ABC):
                  survival: str,
                  cache_phenotype_evaluations: bool = False,
                  random_seed=None,
-                 must_observe=None
+                 must_observe=None,
+                 cache_behavioural_signatures: bool = False,
+                 behavioural_signature: Callable = None,
+                 signature_tolerance: float = 0.0,
+                 probe_rate_bounds: Tuple[float, float] = None,
+                 n_workers: int = None,
+                 evaluation_cache: EvaluationCache = None,
+                 evaluation_context: EvaluationContext = None,
+                 racing: str = None,
+                 racing_confidence: float = 0.05,
+                 racing_score_bounds: tuple = None,
+                 fidelity_scheduler: SuccessiveHalving = None,
+                 build_lockstep_inner_heuristic: Callable = None,
+                 observables_schema: ObservablesSchema = None,
+                 sentence_sizes: Tuple[int, int] = None,
+                 child_queue_size: int = None,
+                 steady_state: bool = False
                  ):
 
         self.cache_phenotype_evaluations = cache_phenotype_evaluations
@@ -44,6 +69,9 @@ class HyperHeuristic(ABC):
 
         if random_seed is not None:
             random.seed(random_seed)
+        # Random choices of the search itself, like variation, come from here: the random module, unless children
+        # are produced in the background
+        self.random = random
 
         self.budget_used = 0
         self.parent_population_fitness = []
@@ -53,72 +81,440 @@ class HyperHeuristic(ABC):
         self.phenotype_cache_hits = 0
         self.phenotype_cache_misses = 0
 
+        # Reuse the fitness of an earlier formula that behaves the same on a set of probe observables. The default
+        # probes spread the rate over probe_rate_bounds, the bounds the inner heuristic keeps its rate within.
+        self.cache_behavioural_signatures = cache_behavioural_signatures
+        if cache_behavioural_signatures and behavioural_signature is None:
+            if probe_rate_bounds is None:
+                raise ValueError("Default behavioural signatures need the probe_rate_bounds of the inner heuristic")
+            behavioural_signature = BehaviouralSignature(get_default_probes(problem.meta_data.n_variables,
+                                                                            probe_rate_bounds))
+        self.behavioural_signature = behavioural_signature
+        self.signature_cache = SignatureCache(signature_tolerance)
+        self.signature_cache_hits = 0
+        self.signature_cache_misses = 0
+
+        # Evaluate on a process pool when n_workers is set. Every trial gets its own seed, drawn in the same order
+        # as serial trials, so results don't depend on the number of workers. The seeds come from a generator of
+        # their own, seeded with one draw from the random module, so they don't replay the stream of the search. The pool runs all trials of a candidate at once, so it can't
+        # run them in lockstep or race them.
+        if n_workers and (build_lockstep_inner_heuristic is not None or racing is not None):
+            raise ValueError("Trials on the process pool can't be run in lockstep or raced")
+        self.n_workers = n_workers
+        self.problem_spec = ProblemSpec.from_problem(problem) if n_workers else None
+        self.trial_seeds = random.Random(random.getrandbits(64))
+        self._executor = None
+
+        # Trial scores shared with other runs, keyed on the problem and inner heuristic settings in the context
+        if evaluation_cache is not None and evaluation_context is None:
+            raise ValueError("An evaluation cache needs an evaluation context to build its keys")
+        self.evaluation_cache = evaluation_cache
+        self.evaluation_context = evaluation_context
+        self.evaluation_cache_hits = 0
+
+        # Stop the trials of a candidate once it can't survive anymore, see Racing. Scores range from 0 to the
+        # optimum plus a leftover budget ratio of at most 1, unless other bounds are given. Racing runs the
+        # trials of a candidate one after another, so it can't be combined with successive halving or lockstep
+        # trials, nor with the process pool, see above.
+        self.racing = None
+        if racing is not None:
+            if survival != 'plus':
+                raise ValueError("Racing needs plus survival, where the weakest parent sets the threshold")
+            if fidelity_scheduler is not None or build_lockstep_inner_heuristic is not None:
+                raise ValueError("Racing can't be combined with successive halving or lockstep trials")
+            if racing_score_bounds is None:
+                racing_score_bounds = (0, problem.optimum.y + 1)
+            self.racing = Racing(racing, racing_score_bounds, racing_confidence)
+        self.racing_evidence = {}
+        self.racing_trials_saved = 0
+
+        # Evaluate candidates at increasing inner budgets, dropping most of them before the full evaluation.
+        # Dropped candidates get the rejected fitness of the scheduler, which only plus survival can rank below
+        # the parents.
+        if fidelity_scheduler is not None:
+            if survival != 'plus':
+                raise ValueError("Successive halving needs plus survival, so rejected candidates can't become parents")
+            if fidelity_scheduler.rungs[-1][1] != trials_per_evaluation:
+                raise ValueError(f"The last rung should run all {trials_per_evaluation} trials per evaluation")
+            if evaluation_context is not None and fidelity_scheduler.rungs[-1][0] != evaluation_context.inner_budget:
+                raise ValueError(f"The last rung should run the inner budget of the evaluation context, "
+                                 f"{evaluation_context.inner_budget}")
+        self.fidelity_scheduler = fidelity_scheduler
+
+        # Run all trials of a candidate together, instead of one inner heuristic after another. This needs a
+        # builder like common.build_lockstep_two_rate_ea.
+        self.build_lockstep_inner_heuristic = build_lockstep_inner_heuristic
+
+        # Compile candidates against the observables schema of the inner heuristic, like TwoRateEa's, so they
+        # read observables by slot
+        self.observables_schema = observables_schema
+
+        # Initialize with sentences of between these numbers of terminals, ramped half-and-half, that contain
+        # the terminals to observe by construction instead of by rejection
+        self.sentence_sizes = sentence_sizes
+
+        # Produce children in a background thread, at most child_queue_size ahead of their evaluation, so
+        # variation and validation overlap with the trials on the process pool. Serial trials hold the GIL, so
+        # there would be nothing to overlap with. Every child gets a random stream of its own, seeded in order, so
+        # the children don't depend on the inner heuristics drawing from the random module.
+        if child_queue_size and not n_workers:
+            raise ValueError("Children are only produced in the background for trials on the process pool")
+        self.child_queue_size = child_queue_size
+        self.child_seeds = random.Random(random.getrandbits(64)) if child_queue_size else None
+
+        # Replace generations by steady-state evolution: every evaluated child goes through plus survival on its
+        # own, and on the process pool a new child is submitted as soon as one finishes, so workers don't wait
+        # for the slowest evaluation of a generation. Children are then generated from the parents at the time.
+        if steady_state:
+            if survival != 'plus':
+                raise ValueError("Steady-state evolution needs plus survival")
+            if fidelity_scheduler is not None or child_queue_size:
+                raise ValueError("Steady-state evolution evaluates children one by one, as they are generated")
+        self.steady_state = steady_state
+
+    def _produce_sized_derivation(self) -> tuple:
+        required_terminals = self.must_observe if type(self.must_observe) is list else ()
+        return self.grammar.produce_ramped_derivation(self.starting_symbol, *self.sentence_sizes, required_terminals,
+                                                      self.random)
+
     @abstractmethod
     def initialize_population(self):
         pass
 
     def run(self):
         print(f"RUN")
+        try:
+            if self.steady_state:
+                self._run_steady_state()
+            else:
+                self._run()
+        finally:
+            self._shutdown_executor()
+        if self.cache_phenotype_evaluations:
+            print(f"There were {self.phenotype_cache_hits} phenotype evaluation cache hits")
+        if self.evaluation_cache is not None:
+            print(f"There were {self.evaluation_cache_hits} evaluation cache hits")
+        if self.fidelity_scheduler is not None:
+            print(f"Candidates promoted from each rung: {self.fidelity_scheduler.promotions}")
+        if self.racing is not None:
+            print(f"Racing stopped {len(self.racing_evidence)} candidates early, "
+                  f"saving {self.racing_trials_saved} trials")
+        if self.cache_behavioural_signatures:
+            print(f"There were {self.signature_cache_hits} behavioural signature cache hits "
+                  f"and {self.signature_cache_misses} misses")
+
+    def _run(self):
         generation = 0
         while (self.budget_used + self.child_population_size) <= self.outer_budget:
             generation += 1
             print(f"  generation {generation} (budget: {self.budget_used}/{self.outer_budget}")
             print(self.parent_population_fitness)
 
-            # Generate new child population
-            child_population = []
-            attempts = 0
-            while len(child_population) < self.child_population_size:
-                child = self._generate_child()  # includes variation
-                attempts += 1
-                # strict = attempts < 5
-                strict = True
-                if self._validate(child, strict=strict):
-                    child_population.append(child)
-                    attempts = 0
-
-            # Evaluate and survive into next generation
-            child_population_fitness = [self._evaluate(child) for child in child_population]
+            # Generate and evaluate new child population
+            if self.child_queue_size:
+                child_population, child_population_fitness = self._produce_and_evaluate_children()
+            else:
+                child_population = [self._generate_valid_child() for _ in range(self.child_population_size)]
+                child_population_fitness = self._evaluate_population(child_population)
+
+            # Survive into next generation
             self.parent_population, self.parent_population_fitness = self._survival(
                 child_population, child_population_fitness)
             print(f"Generation {generation} cache hit rate: {self.phenotype_cache_hits / (self.phenotype_cache_hits + self.phenotype_cache_misses+1)}")
-        if self.cache_phenotype_evaluations:
-            print(f"There were {self.phenotype_cache_hits} phenotype evaluation cache hits")
+
+    def _run_steady_state(self):
+        # Evaluations in flight count against the budget, so the run makes as many evaluations as the
+        # generational loop with one child per generation
+        if not self.n_workers:
+            while self.budget_used < self.outer_budget:
+                child = self._generate_valid_child()
+                self._insert(child, self._evaluate_population([child])[0])
+            return
+
+        # Children by position until they're inserted, like _evaluate_population but with completed evaluations
+        # inserted in the order they finish, so runs on the pool aren't reproducible
+        children = {}
+        results = {}
+        pending = {}
+        futures = {}
+        position = 0
+        while True:
+            while self.budget_used + len(futures) < self.outer_budget and len(futures) < self.n_workers:
+                child = self._generate_valid_child()
+                key = self._look_up(child, position, results, pending)
+                if key is not None:
+                    children[position] = child
+                    futures[key] = self._submit_trials(pending[key][0], self.trials_per_evaluation)
+                elif position in results:
+                    self._insert(child, results.pop(position))
+                else:
+                    children[position] = child  # waits for the same phenotype in flight
+                position += 1
+            if not futures:
+                return
+
+            wait([future for trial_futures in futures.values() for future in trial_futures],
+                 return_when=FIRST_COMPLETED)
+            finished = [key for key, trial_futures in futures.items()
+                        if all(future.done() for future in trial_futures)]
+            for key in finished:
+                serialized_phenotype, positions, signature = pending.pop(key)
+                performance = [future.result() for future in futures.pop(key)]
+                result = self._store_fitness(serialized_phenotype, signature, performance)
+                for child_position in positions:
+                    self._insert(children.pop(child_position), result)
+
+    def _insert(self, child, fitness: float) -> None:
+        self.parent_population, self.parent_population_fitness = self._survival([child], [fitness])
 
     @abstractmethod
     def _generate_child(self):
         pass
 
+    def _generate_valid_child(self):
+        attempts = 0
+        while True:
+            child = self._generate_child()  # includes variation
+            attempts += 1
+            # strict = attempts < 5
+            strict = True
+            if self._validate(child, strict=strict):
+                return child
+
+    def _seed_child(self, seed: int) -> None:
+        self.random = random.Random(seed)
+
+    def _produce_children(self, children: queue.Queue) -> None:
+        # Runs in the producer thread; errors are handed to the consumer
+        try:
+            for _ in range(self.child_population_size):
+                self._seed_child(self.child_seeds.getrandbits(64))
+                children.put(self._generate_valid_child())
+        except Exception as e:
+            children.put(e)
+
+    def _produce_and_evaluate_children(self) -> Tuple[list, list]:
+        children = queue.Queue(self.child_queue_size)
+        producer = threading.Thread(target=self._produce_children, args=(children,), daemon=True)
+        producer.start()
+        child_population = []
+
+        def produced():
+            for _ in range(self.child_population_size):
+                child = children.get()
+                if isinstance(child, Exception):
+                    raise child
+                child_population.append(child)
+                yield child
+
+        child_population_fitness = self._evaluate_population(produced())
+        producer.join()
+        return child_population, child_population_fitness
+
     @abstractmethod
     def _validate(self, individual: tree.Tree, strict: bool) -> bool:
         pass
 
-    def _evaluate(self, individual: tree.Tree):
+    def _phenotype(self, individual) -> tree.Tree:
+        # Evaluate the canonical phenotype, so equivalent phenotypes share a cache entry and dead structure
+        # isn't re-evaluated every inner epoch
+        return individual.canonicalize()
+
+    def _evaluate(self, individual):
+        phenotype = self._phenotype(individual)
+        serialized_phenotype = phenotype.serialize()
+        result, signature = self._get_cached_fitness(phenotype, serialized_phenotype)
+        if result is not None:
+            return result
+
+        if self.build_lockstep_inner_heuristic is not None:
+            performance = run_lockstep_trials(self.problem, self.build_lockstep_inner_heuristic,
+                                              phenotype.evaluate_batch, self.trials_per_evaluation)
+            return self._store_fitness(serialized_phenotype, signature, performance)
+
+        evaluate = phenotype.compile(self.observables_schema)
+        threshold = self._survival_threshold()
+        performance = []
+        for _ in range(self.trials_per_evaluation):
+            performance.append(self._run_trial(evaluate))
+            if threshold is not None and self.racing.cannot_reach(performance, self.trials_per_evaluation, threshold):
+                # Keep the scores of the trials that did run; the candidate is stored with their mean, which is
+                # below the threshold as well
+                self.racing_trials_saved += self.trials_per_evaluation - len(performance)
+                self.racing_evidence[serialized_phenotype] = performance
+                break
+        return self._store_fitness(serialized_phenotype, signature, performance)
+
+    def _survival_threshold(self):
+        # Fitness a child has to beat to survive, known once the parent population is complete
+        if self.racing is None or len(self.parent_population_fitness) < self.parent_population_size:
+            return None
+        return min(self.parent_population_fitness)
+
+    def _evaluate_population(self, individuals: Iterable, full_fidelity: bool = False) -> list:
+        # Individuals may come from a generator, like the children of the producer thread. With full_fidelity,
+        # successive halving only runs the last rung, like for the initial population, which has no parents to
+        # rank rejected candidates below.
+        if not self.n_workers and self.fidelity_scheduler is None:
+            return [self._evaluate(individual) for individual in individuals]
+
+        results = []
+        pending = {}
+        if self.fidelity_scheduler is None:
+            # The trials of every phenotype go to the process pool once it's looked up, so they run while the
+            # next individuals are looked up or produced
+            futures = {}
+            for position, individual in enumerate(individuals):
+                results.append(None)
+                key = self._look_up(individual, position, results, pending)
+                if key is not None:
+                    futures[key] = self._submit_trials(pending[key][0], self.trials_per_evaluation)
+            for key, (serialized_phenotype, positions, signature) in pending.items():
+                performance = [future.result() for future in futures[key]]
+                result = self._store_fitness(serialized_phenotype, signature, performance)
+                for position in positions:
+                    results[position] = result
+            return results
+
+        # Look everything up first, then run the trials of all remaining phenotypes at once
+        for position, individual in enumerate(individuals):
+            results.append(None)
+            self._look_up(individual, position, results, pending)
+        candidates = list(pending.values())
+
+        # Climb the rungs of the scheduler, only the promoted candidates move on to the next one
+        rungs = self.fidelity_scheduler.rungs[-1:] if full_fidelity else self.fidelity_scheduler.rungs
+        last_rung = len(rungs) - 1
+        for rung, (budget, trials) in enumerate(rungs):
+            performances = self._run_trials([candidate[0] for candidate in candidates], trials, budget)
+            if rung == last_rung:
+                promotions = [True] * len(candidates)
+            else:
+                promotions = self.fidelity_scheduler.promote(rung, [np.mean(scores) for scores in performances])
+            promoted_candidates = []
+            for candidate, performance, promoted in zip(candidates, performances, promotions):
+                serialized_phenotype, positions, signature = candidate
+                if rung < last_rung and promoted:
+                    promoted_candidates.append(candidate)
+                    continue
+                result = self._store_fitness(serialized_phenotype, signature, performance,
+                                             None if rung == last_rung else self.fidelity_scheduler.rejected_fitness)
+                for position in positions:
+                    results[position] = result
+            candidates = promoted_candidates
+        return results
+
+    def _look_up(self, individual, position: int, results: list, pending: dict):
+        # Fills in the result of an individual with a cached phenotype, or adds it to the pending phenotypes.
+        # Returns the key of a newly pending phenotype.
+        phenotype = self._phenotype(individual)
+        serialized_phenotype = phenotype.serialize()
+        if self.cache_phenotype_evaluations and serialized_phenotype in pending:
+            self.phenotype_cache_hits += 1
+            pending[serialized_phenotype][1].append(position)
+            return None
+        result, signature = self._get_cached_fitness(phenotype, serialized_phenotype)
+        if result is not None:
+            results[position] = result
+            return None
+        key = serialized_phenotype if self.cache_phenotype_evaluations else position
+        pending[key] = (serialized_phenotype, [position], signature)
+        return key
+
+    def _run_trials(self, serialized_phenotypes: list, trials: int, budget: int = None) -> list:
+        # Returns the scores of all trials of every phenotype, from the process pool if there is one
+        if not self.n_workers and self.build_lockstep_inner_heuristic is not None:
+            return [run_lockstep_trials(self.problem, self.build_lockstep_inner_heuristic,
+                                        tree.create(serialized_phenotype).evaluate_batch, trials, budget)
+                    for serialized_phenotype in serialized_phenotypes]
+        if not self.n_workers:
+            performances = []
+            for serialized_phenotype in serialized_phenotypes:
+                evaluate = tree.compile(tree.create(serialized_phenotype), self.observables_schema)
+                performances.append([self._run_trial(evaluate, budget) for _ in range(trials)])
+            return performances
+
+        futures = [self._submit_trials(serialized_phenotype, trials, budget)
+                   for serialized_phenotype in serialized_phenotypes]
+        return [[future.result() for future in phenotype_futures] for phenotype_futures in futures]
+
+    def _run_trial(self, evaluate: Callable, budget: int = None) -> float:
+        # Seeded like a trial on the process pool, leaving the random stream of the search as it was
+        state = random.getstate()
+        random.seed(self.trial_seeds.getrandbits(64))
+        try:
+            return run_trial(self.problem, self.build_inner_heuristic, evaluate, budget)
+        finally:
+            random.setstate(state)
+
+    def _submit_trials(self, serialized_phenotype: str, trials: int, budget: int = None) -> List[Future]:
+        executor = self._get_executor()
+        # Seeds are drawn in submission order, so results don't depend on the number of workers
+        return [executor.submit(run_trial_in_worker, self.problem_spec, self.build_inner_heuristic,
+                                serialized_phenotype, self.trial_seeds.getrandbits(64), budget, self.observables_schema)
+                for _ in range(trials)]
+
+    def _get_cached_fitness(self, phenotype: tree.Tree, serialized_phenotype: str):
+        # Returns the cached fitness if there is one, and the behavioural signature to store the result under
         if self.cache_phenotype_evaluations:
-            serialized_phenotype = individual.serialize()
             if serialized_phenotype in self.evaluated_phenotypes_cache:
                 self.phenotype_cache_hits += 1
-                return self.evaluated_phenotypes_cache[serialized_phenotype]
+                return self.evaluated_phenotypes_cache[serialized_phenotype], None
             else:
                 self.phenotype_cache_misses += 1
 
-        performance = []
-        for i in range(self.trials_per_evaluation):
-            inner_heuristic = self.build_inner_heuristic(self.problem, individual.evaluate)
-            y_best, x_best, f = inner_heuristic.run()
+        if self.evaluation_cache is not None:
+            scores = self.evaluation_cache.get(self._evaluation_key(serialized_phenotype))
+            if scores is not None:
+                # Counted against the budget like a real evaluation, so a warm cache saves time but not budget
+                self.evaluation_cache_hits += 1
+                self.budget_used += 1
+                result = np.mean(scores)
+                if self.cache_phenotype_evaluations:
+                    self.evaluated_phenotypes_cache[serialized_phenotype] = result
+                return result, None
 
-            leftover_budget = inner_heuristic.budget - f.state.evaluations
-            leftover_ratio = leftover_budget / inner_heuristic.budget
-            score = y_best + leftover_ratio  # leftover budget ratio is a tiebreaker
+        signature = None
+        if self.cache_behavioural_signatures:
+            signature = self.behavioural_signature(phenotype)
+            result = self.signature_cache.get(signature)
+            if result is not None:
+                self.signature_cache_hits += 1
+                if self.cache_phenotype_evaluations:
+                    self.evaluated_phenotypes_cache[serialized_phenotype] = result
+                return result, signature
+            self.signature_cache_misses += 1
+        return None, signature
 
-            performance.append(score)
-            self.problem.reset()
+    def _store_fitness(self, serialized_phenotype: str, signature, performance: list, result: float = None) -> float:
+        # The fitness is the mean score, unless given, like the rejected fitness of the fidelity scheduler, which
+        # isn't cached: the phenotype gets evaluated again when it comes back. Only complete evaluations go to the
+        # evaluation cache.
         self.budget_used += 1
+        if result is not None:
+            return result
         result = np.mean(performance)
         if self.cache_phenotype_evaluations:
-            self.evaluated_phenotypes_cache[individual.serialize()] = result
+            self.evaluated_phenotypes_cache[serialized_phenotype] = result
+        if self.cache_behavioural_signatures:
+            self.signature_cache.add(signature, result)
+        if self.evaluation_cache is not None and len(performance) == self.trials_per_evaluation:
+            self.evaluation_cache.put(self._evaluation_key(serialized_phenotype), performance)
         return result
 
+    def _evaluation_key(self, serialized_phenotype: str):
+        return self.evaluation_context.key(self.trials_per_evaluation, serialized_phenotype)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+        return self._executor
+
+    def _shutdown_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
     def _survival(self, child_population, child_population_fitness):
         if self.survival == 'comma':
             child_population, child_population_fitness = self._sort_by_fitness(child_population,
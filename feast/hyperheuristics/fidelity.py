@@ -0,0 +1,38 @@
+import math
+from typing import List, Tuple
+
+
+class SuccessiveHalving:
+    # Evaluates candidates on rungs of increasing inner budget and trials, the last rung being the full evaluation.
+    # After each rung, a candidate moves up only if its mean score is in the top 1/eta of all scores seen on that
+    # rung so far, across generations, so this also works when candidates arrive one at a time. Candidates that
+    # are not promoted get rejected_fitness, since scores at a reduced budget can't be compared to full ones; it's
+    # not cached, so a rejected phenotype that comes back is evaluated again.
+    rejected_fitness = float('-inf')
+
+    def __init__(self, rungs: List[Tuple[int, int]], eta: float = 3):
+        if not rungs:
+            raise ValueError("Successive halving needs at least one rung")
+        self.rungs = rungs
+        self.eta = eta
+        self.rung_scores = [[] for _ in rungs]
+        self.promotions = [0 for _ in rungs[:-1]]
+
+    @classmethod
+    def geometric(cls, inner_budget: int, trials: int, number_of_rungs: int = 3, eta: float = 3) -> 'SuccessiveHalving':
+        # Each rung below the full evaluation gets 1/eta of the budget and trials of the one above it
+        rungs = []
+        for rung in range(number_of_rungs):
+            reduction = eta ** (number_of_rungs - 1 - rung)
+            rungs.append((max(1, round(inner_budget / reduction)), max(1, math.floor(trials / reduction))))
+        rungs[-1] = (inner_budget, trials)
+        return cls(rungs, eta)
+
+    def promote(self, rung: int, scores: List[float]) -> List[bool]:
+        history = self.rung_scores[rung]
+        history.extend(scores)
+        number_promoted = max(1, math.floor(len(history) / self.eta))
+        cutoff = sorted(history, reverse=True)[number_promoted - 1]
+        promotions = [score >= cutoff for score in scores]
+        self.promotions[rung] += int(sum(promotions))
+        return promotions
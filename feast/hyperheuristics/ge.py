@@ -1,13 +1,29 @@
 import random
-from typing import Callable
+from typing import Callable, Iterable
 
+import numpy as np
 from ioh import ProblemType
 
 import feast.tree as tree
+from feast.fingerprint import FingerprintSet, fingerprint, fingerprint_array
 from feast.grammar import Grammar
 from feast.hyperheuristics.base import HyperHeuristic
 
 
+class GEIndividual:
+    # A genome with everything derived from it, so it's mapped and parsed only once
+    __slots__ = ('genome', 'derivation', 'recipe', 'coding_length', 'tree', 'phenotype', 'fitness')
+
+    def __init__(self, genome: np.ndarray):
+        self.genome = genome
+        self.derivation = None
+        self.recipe = None
+        self.coding_length = None
+        self.tree = None
+        self.phenotype = None  # the canonical tree, once needed
+        self.fitness = None
+
+
 class GE(HyperHeuristic):
     def __init__(
             self,
@@ -29,7 +45,8 @@ class GE(HyperHeuristic):
             survival: str = 'comma',
             cache_phenotype_evaluations=False,
             random_seed=None,
-            must_observe=None
+            must_observe=None,
+            **kwargs  # options of HyperHeuristic, like n_workers or racing
     ):
         super().__init__(
             grammar=grammar,
@@ -43,11 +60,13 @@ class GE(HyperHeuristic):
             survival=survival,
             cache_phenotype_evaluations=cache_phenotype_evaluations,
             random_seed=random_seed,
-            must_observe=must_observe
+            must_observe=must_observe,
+            **kwargs
         )
-        self.genotypes = set()
-        self.coding_genotypes = set()
-        self.phenotypes = set()
+        # Fingerprints of the genomes, coding genomes and phenotypes seen so far
+        self.genotypes = FingerprintSet()
+        self.coding_genotypes = FingerprintSet()
+        self.phenotypes = FingerprintSet()
         self.crossover_probability: float = crossover_probability
         self.mutation_probability: float = mutation_probability
         self.genome_length: int = genome_length
@@ -55,105 +74,147 @@ class GE(HyperHeuristic):
         self.enforce_unique_genotypes = enforce_unique_genotypes
         self.enforce_unique_coding_genotypes = enforce_unique_coding_genotypes
         self.enforce_unique_phenotypes = enforce_unique_phenotypes
+        # Genomes are integer arrays, drawn from a generator seeded from random so random_seed still applies.
+        # Initial genomes are drawn as rows of one array, but variation works on one genome at a time, since
+        # children are generated, validated and mapped one by one, and mapping costs far more than variation.
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        self.genome_dtype = np.int32
 
     def initialize_population(self):
         # Generate a parent population, subject to validation constraints constraints
         while len(self.parent_population) < self.parent_population_size:
-            parent = [random.randint(0, self.codon_size - 1) for i in range(self.genome_length)]
-            if self._validate(parent):
-                self.parent_population.append(parent)
+            if self.sentence_sizes is not None:
+                # Genomes that encode sized derivations, padded with random codons
+                _, choices = self._produce_sized_derivation()
+                genome = self.grammar.encode_genome(choices, self.genome_length, self.codon_size, self.rng,
+                                                    self.genome_dtype)
+                parent = self._create_individual(genome)
+                if self._validate(parent):
+                    self.parent_population.append(parent)
+                continue
+            genomes = self.rng.integers(0, self.codon_size, (self.parent_population_size, self.genome_length),
+                                        dtype=self.genome_dtype)
+            for genome in genomes:
+                parent = self._create_individual(genome)
+                if self._validate(parent):
+                    self.parent_population.append(parent)
+                if len(self.parent_population) == self.parent_population_size:
+                    break
 
         # Evaluate the parent population
-        self.parent_population_fitness = [self._evaluate(parent) for parent in self.parent_population]
+        self.parent_population_fitness = self._evaluate_population(self.parent_population, full_fidelity=True)
         self.parent_population, self.parent_population_fitness = self._sort_by_fitness(
             self.parent_population, self.parent_population_fitness)
 
     def get_individual(self, index: int):
-        recipe = self.get_recipe(index)
-        return self._recipe_to_root(recipe)
+        return self.parent_population[index].tree
 
     @staticmethod
     def _recipe_to_root(recipe):
         return tree.create(recipe)
 
     def get_recipe(self, index: int):
-        genome = self.parent_population[index]
-        return self._genome_to_recipe(genome)
+        return self.parent_population[index].recipe
 
     def _genome_to_recipe(self, genome):
         recipe = self.grammar.get_sentence_from_genome(genome, starting_symbol=self.starting_symbol)
         return recipe
 
-    def _evaluate(self, individual):
-        root = self._recipe_to_root(self._genome_to_recipe(individual))
-        return super()._evaluate(root)
-
-    def _validate(self, genome, strict=True):
-        try:
-            recipe = self._genome_to_recipe(genome)
-        except ValueError as e:
-            return False
+    def _create_individual(self, genome, parent: GEIndividual = None, changed_from: int = 0) -> GEIndividual:
+        # Map the genome once; individuals that don't map to a tree keep None as recipe or tree. Children that
+        # only differ from their parent from codon changed_from on resume the parent's derivation there.
+        individual = GEIndividual(genome)
+        individual.derivation = self.grammar.derive_from_genome(
+            genome, self.starting_symbol, None if parent is None else parent.derivation, changed_from)
+        if not individual.derivation.complete:
+            return individual
+        individual.recipe = self.grammar.get_derived_sentence(individual.derivation)
+        individual.coding_length = individual.derivation.coding_length
 
         try:
-            root = self._recipe_to_root(recipe)
+            individual.tree = self._recipe_to_root(individual.recipe)
         except ValueError as e:
-            print(f"ValueError: {recipe}")
-            return False
+            print(f"ValueError: {individual.recipe}")
         except AttributeError as e:
-            print(f"AttributeError: {recipe}")
+            print(f"AttributeError: {individual.recipe}")
+        return individual
+
+    def _phenotype(self, individual):
+        if individual.phenotype is None:
+            individual.phenotype = super()._phenotype(individual.tree)
+        return individual.phenotype
+
+    def _evaluate_population(self, individuals: Iterable, full_fidelity: bool = False) -> list:
+        # Individuals may come from a generator, so keep them while they're evaluated
+        evaluated = []
+
+        def keep():
+            for individual in individuals:
+                evaluated.append(individual)
+                yield individual
+
+        fitness = super()._evaluate_population(keep(), full_fidelity)
+        for individual, individual_fitness in zip(evaluated, fitness):
+            individual.fitness = individual_fitness
+        return fitness
+
+    def _insert(self, child, fitness: float) -> None:
+        child.fitness = fitness
+        super()._insert(child, fitness)
+
+    def _seed_child(self, seed: int) -> None:
+        super()._seed_child(seed)
+        self.rng = np.random.default_rng(seed)
+
+    def _validate(self, individual, strict=True):
+        if individual.tree is None:
             return False
 
         if self.must_observe and type(self.must_observe) is list:
             for terminal in self.must_observe:
-                if terminal not in recipe:
+                if terminal not in individual.recipe:
                     return False
 
         if not strict:
             return True
 
         if self.enforce_unique_coding_genotypes:
-            coding_length = self._get_coding_length(genome)
-            signature = '.'.join([str(i) for i in genome[:coding_length]])
+            signature = fingerprint_array(individual.genome[:individual.coding_length])
             if signature in self.coding_genotypes:
                 return False
             self.coding_genotypes.add(signature)
 
         if self.enforce_unique_genotypes:
-            signature = '.'.join([str(i) for i in genome])
+            signature = fingerprint_array(individual.genome)
             if signature in self.genotypes:
                 return False
             self.genotypes.add(signature)
 
         if self.enforce_unique_phenotypes:
-            if recipe in self.phenotypes:
+            signature = fingerprint(self._phenotype(individual).serialize().encode())
+            if signature in self.phenotypes:
                 return False
-            self.phenotypes.add(recipe)
+            self.phenotypes.add(signature)
 
         return True
 
     def _generate_child(self):
-        p1 = random.sample(self.parent_population, 1)[0]
-        if self.crossover_probability > random.uniform(0, 1):
+        p1 = self.random.sample(self.parent_population, 1)[0]
+        if self.crossover_probability > self.random.uniform(0, 1):
             p2 = p1
-            while p2 == p1:
-                p2 = random.sample(self.parent_population, 1)[0]
+            while np.array_equal(p2.genome, p1.genome):
+                p2 = self.random.sample(self.parent_population, 1)[0]
             return self._crossover(p1, p2)
         else:
             return self._mutation(p1)
 
     def _crossover(self, p1, p2):
         # Crossover at a point that is within the coding length of both parents
-        coding_length_p1 = self._get_coding_length(p1)
-        coding_length_p2 = self._get_coding_length(p2)
-        point = random.randint(0, min(coding_length_p1, coding_length_p2))
-        return p1[:point] + p2[point:]
+        point = self.random.randint(0, min(p1.coding_length, p2.coding_length))
+        return self._create_individual(np.concatenate([p1.genome[:point], p2.genome[point:]]), p1, point)
 
     def _mutation(self, p1):
-        coding_length_p1 = self._get_coding_length(p1)
-        child = p1.copy()
-        point = random.randint(0, coding_length_p1)
-        child[point] = random.randint(0, self.codon_size - 1)
-        return child
-
-    def _get_coding_length(self, genome):
-        return self.grammar.get_genome_coding_length(genome, self.starting_symbol)
+        child = p1.genome.copy()
+        point = self.random.randint(0, p1.coding_length)
+        child[point] = self.rng.integers(0, self.codon_size)
+        return self._create_individual(child, p1, point)
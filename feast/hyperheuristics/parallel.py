@@ -0,0 +1,85 @@
+import random
+from typing import Callable, List, NamedTuple
+
+import ioh
+from ioh import ProblemClass, ProblemType
+
+import feast.problems as problems
+import feast.tree as tree
+from metaheuristics.observables import ObservablesSchema
+
+# ioh base classes of the problem suites, most specific first
+PROBLEM_CLASSES = [
+    (ioh.iohcpp.problem.PBO, ProblemClass.PBO),
+    (ioh.iohcpp.problem.BBOB, ProblemClass.BBOB),
+    (ioh.iohcpp.problem.IntegerSingleObjective, ProblemClass.INTEGER),
+    (ioh.iohcpp.problem.RealSingleObjective, ProblemClass.REAL),
+]
+
+
+class ProblemSpec(NamedTuple):
+    # ioh problems can't be pickled, so workers rebuild them from this
+    problem_id: int
+    instance: int
+    dimension: int
+    problem_class: ProblemClass
+    native: bool = False
+
+    @classmethod
+    def from_problem(cls, problem: ProblemType) -> 'ProblemSpec':
+        if isinstance(problem, problems.PboProblem):
+            meta_data = problem.meta_data
+            return cls(meta_data.problem_id, meta_data.instance, meta_data.n_variables, ProblemClass.PBO, True)
+        for base_class, problem_class in PROBLEM_CLASSES:
+            if isinstance(problem, base_class):
+                meta_data = problem.meta_data
+                return cls(meta_data.problem_id, meta_data.instance, meta_data.n_variables, problem_class)
+        raise ValueError(f"Cannot determine the problem class of {problem.meta_data}")
+
+    def build(self) -> ProblemType:
+        if self.native:
+            return problems.get_problem(self.problem_id, self.instance, self.dimension)
+        return ioh.get_problem(self.problem_id, self.instance, self.dimension, self.problem_class)
+
+
+# Problems built by this process, so each worker builds every problem only once
+WORKER_PROBLEMS = {}
+
+
+def run_trial(problem: ProblemType, build_inner_heuristic: Callable, evaluate: Callable, budget: int = None) -> float:
+    # Without a budget, the inner heuristic gets its default one
+    if budget is None:
+        inner_heuristic = build_inner_heuristic(problem, evaluate)
+    else:
+        inner_heuristic = build_inner_heuristic(problem, evaluate, budget)
+    y_best, x_best, f = inner_heuristic.run()
+
+    leftover_budget = inner_heuristic.budget - f.state.evaluations
+    leftover_ratio = leftover_budget / inner_heuristic.budget
+    problem.reset()
+    return y_best + leftover_ratio  # leftover budget ratio is a tiebreaker
+
+
+def run_lockstep_trials(problem: ProblemType, build_lockstep_inner_heuristic: Callable, batch_evaluate: Callable,
+                        trials: int, budget: int = None) -> List[float]:
+    # All trials at once, on an inner heuristic that runs them in lockstep
+    if budget is None:
+        inner_heuristic = build_lockstep_inner_heuristic(problem, batch_evaluate, trials)
+    else:
+        inner_heuristic = build_lockstep_inner_heuristic(problem, batch_evaluate, trials, budget)
+    y_best, x_best, evaluations = inner_heuristic.run()
+
+    leftover_ratios = (inner_heuristic.budget - evaluations) / inner_heuristic.budget
+    problem.reset()
+    return [float(score) for score in y_best + leftover_ratios]
+
+
+def run_trial_in_worker(problem_spec: ProblemSpec, build_inner_heuristic: Callable, recipe: str, seed: int,
+                        budget: int = None, observables_schema: ObservablesSchema = None) -> float:
+    # Compiled phenotypes can't be pickled either, so the worker compiles the recipe itself
+    if problem_spec not in WORKER_PROBLEMS:
+        WORKER_PROBLEMS[problem_spec] = problem_spec.build()
+    problem = WORKER_PROBLEMS[problem_spec]
+    problem.reset()
+    random.seed(seed)
+    return run_trial(problem, build_inner_heuristic, tree.compile(tree.create(recipe), observables_schema), budget)
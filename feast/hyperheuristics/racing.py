@@ -0,0 +1,30 @@
+import math
+from typing import List, Tuple
+
+
+class Racing:
+    # Decides when the remaining trials of a candidate can be skipped, because its mean score over all trials
+    # can't reach the survival threshold anymore.
+    # 'bound': exact, assumes every remaining trial reaches the upper score bound.
+    # 'hoeffding': assumes the remaining trials score no more than a Hoeffding upper confidence bound on the
+    # candidate's expected score, so a candidate that could still survive is dropped with probability at most
+    # `confidence`.
+    modes = ['bound', 'hoeffding']
+
+    def __init__(self, mode: str, score_bounds: Tuple[float, float], confidence: float = 0.05):
+        if mode not in self.modes:
+            raise ValueError(f"Invalid racing mode: {mode}")
+        self.mode = mode
+        self.lower_bound, self.upper_bound = score_bounds
+        self.confidence = confidence
+
+    def cannot_reach(self, scores: List[float], trials: int, threshold: float) -> bool:
+        remaining = trials - len(scores)
+        if remaining <= 0:
+            return False
+        remaining_score = self.upper_bound
+        if self.mode == 'hoeffding':
+            width = (self.upper_bound - self.lower_bound) * math.sqrt(
+                math.log(1 / self.confidence) / (2 * len(scores)))
+            remaining_score = min(sum(scores) / len(scores) + width, self.upper_bound)
+        return (sum(scores) + remaining * remaining_score) / trials < threshold
@@ -1,6 +1,9 @@
+import random
+
 from ioh import ProblemType
 
 import feast.tree as tree
+from feast.fingerprint import FingerprintSet, fingerprint
 from feast.grammar import Grammar
 from feast.hyperheuristics.base import HyperHeuristic
 
@@ -15,7 +18,9 @@ class RandomSearch(HyperHeuristic):
                  trials_per_evaluation: int,
                  must_observe=None,
                  cache_phenotype_evaluations: bool = True,
-                 soft_limit=3
+                 soft_limit=3,
+                 enumerate_sentences=False,
+                 **kwargs  # options of HyperHeuristic, like n_workers or racing
                  ):
         super().__init__(
             grammar=grammar,
@@ -27,23 +32,53 @@ class RandomSearch(HyperHeuristic):
             parent_population_size=1,
             child_population_size=1,
             survival='plus',
-            cache_phenotype_evaluations=cache_phenotype_evaluations
+            cache_phenotype_evaluations=cache_phenotype_evaluations,
+            **kwargs
         )
         self.soft_limit = soft_limit
         self.must_observe = must_observe
 
+        # Instead of drawing sentences independently, go through all sentences by size, within sentence_sizes if
+        # given, in a random order within each size, and skip those with a phenotype seen before
+        self.enumerate_sentences = enumerate_sentences
+        self.sentences = None
+        self.seen_phenotypes = FingerprintSet()
+
     def initialize_population(self):
+        if self.enumerate_sentences:
+            minimum_size, maximum_size = (1, None) if self.sentence_sizes is None else self.sentence_sizes
+            # The enumeration draws lazily, so it gets its own stream, which children produced in the background
+            # share with nothing else
+            self.sentences = self.grammar.enumerate_sentences(self.starting_symbol, minimum_size, maximum_size,
+                                                              shuffle=True, rng=random.Random(random.getrandbits(64)))
+        if self.enumerate_sentences or self.sentence_sizes is not None:
+            root = self._generate_child()
+            self.parent_population = [root]
+            self.parent_population_fitness = self._evaluate_population([root], full_fidelity=True)
+            return
         while True:
-            recipe = self.grammar.produce_random_sentence(soft_limit=self.soft_limit, starting_symbol='NUM')
+            recipe = self.grammar.produce_random_sentence(soft_limit=self.soft_limit, starting_symbol='NUM',
+                                                          rng=self.random)
             root = tree.create(recipe)
             if self._validate(root, False):
                 self.parent_population = [root]
-                self.parent_population_fitness = [self._evaluate(root)]
+                self.parent_population_fitness = self._evaluate_population([root], full_fidelity=True)
                 return
 
     def _generate_child(self):
+        if self.enumerate_sentences:
+            for recipe in self.sentences:
+                root = tree.create(recipe)
+                if self._validate(root, False) and \
+                        self.seen_phenotypes.add(fingerprint(root.canonicalize().serialize().encode())):
+                    return root
+            raise ValueError("Every sentence within the sentence sizes has been tried")
+        if self.sentence_sizes is not None:
+            recipe, _ = self._produce_sized_derivation()
+            return tree.create(recipe)
         while True:
-            recipe = self.grammar.produce_random_sentence(soft_limit=self.soft_limit, starting_symbol='NUM')
+            recipe = self.grammar.produce_random_sentence(soft_limit=self.soft_limit, starting_symbol='NUM',
+                                                          rng=self.random)
             root = tree.create(recipe)
             if self._validate(root, False):
                 return root
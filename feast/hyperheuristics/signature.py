@@ -0,0 +1,75 @@
+from typing import Tuple, Union
+
+import numpy as np
+
+import feast.tree as tree
+
+
+def get_default_probes(dimension: int, rate_bounds: Tuple[float, float]) -> dict:
+    # Every combination of a spread of rates and best_child_is_low, at the problem's dimension. The inner heuristic
+    # keeps its rate within rate_bounds, like TwoRateEa.rate_bounds, so formulas only have to agree on the rates in
+    # between.
+    min_rate, max_rate = rate_bounds
+    rates = np.unique(np.concatenate([np.linspace(min_rate, max_rate, 5),
+                                      np.arange(np.ceil(min_rate), np.floor(max_rate) + 1)]))
+    rates, best_child_is_low = np.meshgrid(rates, [True, False])
+    return {
+        'boolean': {'best_child_is_low': best_child_is_low.ravel()},
+        'numeric': {'rate': rates.ravel(), 'dimension': np.full(rates.size, dimension)}
+    }
+
+
+class BehaviouralSignature:
+    # Outputs of a formula on a fixed set of observable states, with random nodes seeded.
+    # Formulas with matching signatures are assumed to implement the same adaptation rule.
+    def __init__(self, probes: dict, random_seed: int = 0):
+        self.probes = probes
+        self.random_seed = random_seed
+
+    def __call__(self, individual: tree.Tree) -> np.ndarray:
+        rng = np.random.default_rng(self.random_seed)
+        return individual.evaluate_batch(self.probes, rng).astype(float)
+
+
+class SignatureCache:
+    def __init__(self, tolerance: float = 0.0):
+        self.tolerance = tolerance
+        self.exact_matches = {}
+        self.signatures = []
+        self.fitnesses = []
+        self._stacked_signatures = None
+
+    def get(self, signature: np.ndarray) -> Union[float, None]:
+        signature = self._normalize(signature)
+        key = signature.tobytes()
+        if key in self.exact_matches:
+            return self.exact_matches[key]
+        if self.tolerance <= 0 or not self.signatures:
+            return None
+
+        if self._stacked_signatures is None:
+            self._stacked_signatures = np.stack(self.signatures)
+        with np.errstate(invalid='ignore'):
+            differences = np.abs(self._stacked_signatures - signature)
+        differences[np.isnan(self._stacked_signatures) & np.isnan(signature)] = 0  # nan matches nan
+        differences[np.isnan(differences)] = np.inf
+        distances = differences.max(axis=1)
+        closest = int(np.argmin(distances))
+        if distances[closest] <= self.tolerance:
+            return self.fitnesses[closest]
+        return None
+
+    def add(self, signature: np.ndarray, fitness: float) -> None:
+        signature = self._normalize(signature)
+        self.exact_matches[signature.tobytes()] = fitness
+        if self.tolerance > 0:
+            self.signatures.append(signature)
+            self.fitnesses.append(fitness)
+            self._stacked_signatures = None
+
+    @staticmethod
+    def _normalize(signature: np.ndarray) -> np.ndarray:
+        # -0.0 and 0.0, and all nan payloads, should give the same bytes
+        signature = np.array(signature, dtype=float).ravel() + 0.0
+        signature[np.isnan(signature)] = np.nan
+        return signature
@@ -0,0 +1,133 @@
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple
+
+import numpy as np
+
+
+# Vectorized versions of the ioh PBO problems we run experiments on. They take whole populations at once and skip
+# ioh's per-call conversion, logging and bookkeeping, so they are meant for the search phase; final benchmarks
+# should still run on ioh, with a logger attached. Only instance 1 is implemented, since the other instances
+# depend on transformations drawn by ioh's own random generator.
+
+class MetaData(NamedTuple):
+    problem_id: int
+    instance: int
+    n_variables: int
+    name: str
+
+
+class Solution(NamedTuple):
+    x: List[int]
+    y: float
+
+
+class State:
+    # The parts of ioh's problem state that the inner heuristics rely on
+    def __init__(self):
+        self.evaluations = 0
+        self.current_best = Solution([], float('-inf'))
+        self.optimum_found = False
+
+    def update_one(self, x: list, y: float, optimum: float) -> None:
+        self.evaluations += 1
+        if y > self.current_best.y:
+            self.current_best = Solution(list(x), y)
+            self.optimum_found = y >= optimum
+
+    def update(self, population: np.ndarray, fitness: np.ndarray, optimum: float) -> None:
+        self.evaluations += len(fitness)
+        if len(fitness) == 0:
+            return
+        best = int(np.argmax(fitness))
+        if fitness[best] > self.current_best.y:
+            self.current_best = Solution(population[best].tolist(), float(fitness[best]))
+            self.optimum_found = self.current_best.y >= optimum
+
+
+class PboProblem(ABC):
+    problem_id = None
+    name = None
+
+    def __init__(self, instance: int, dimension: int):
+        if instance != 1:
+            raise ValueError(f"Only instance 1 of {self.name} is implemented, not instance {instance}")
+        self.meta_data = MetaData(self.problem_id, instance, dimension, self.name)
+        self.optimum = Solution([1] * dimension, float(dimension))
+        self.state = State()
+
+    def __call__(self, x) -> float:
+        # Single solutions are evaluated in plain Python, which beats NumPy's call overhead at these sizes
+        if isinstance(x, np.ndarray):
+            x = x.tolist()
+        y = float(self._evaluate_one(x))
+        self.state.update_one(x, y, self.optimum.y)
+        return y
+
+    def evaluate_batch(self, population: np.ndarray) -> np.ndarray:
+        # One fitness per row of a (children x dimension) array of bits
+        population = np.asarray(population, dtype=np.uint8)
+        fitness = self._evaluate(population).astype(float)
+        self.state.update(population, fitness, self.optimum.y)
+        return fitness
+
+    @abstractmethod
+    def _evaluate(self, population: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def _evaluate_one(self, x: list) -> int:
+        pass
+
+    def reset(self) -> None:
+        self.state = State()
+
+    def __repr__(self) -> str:
+        return f"<{self.name} id: {self.problem_id} iid: {self.meta_data.instance} dim: {self.meta_data.n_variables}>"
+
+
+class OneMax(PboProblem):
+    problem_id = 1
+    name = 'OneMax'
+
+    def _evaluate(self, population: np.ndarray) -> np.ndarray:
+        return population.sum(axis=1)
+
+    def _evaluate_one(self, x: list) -> int:
+        return sum(x)
+
+
+class LeadingOnes(PboProblem):
+    problem_id = 2
+    name = 'LeadingOnes'
+
+    def _evaluate(self, population: np.ndarray) -> np.ndarray:
+        # Position of the first zero, with a sentinel zero for all-one rows
+        padded = np.concatenate([population, np.zeros((len(population), 1), dtype=np.uint8)], axis=1)
+        return np.argmin(padded, axis=1)
+
+    def _evaluate_one(self, x: list) -> int:
+        for i, bit in enumerate(x):
+            if not bit:
+                return i
+        return len(x)
+
+
+class IsingRing(PboProblem):
+    problem_id = 19
+    name = 'IsingRing'
+
+    def _evaluate(self, population: np.ndarray) -> np.ndarray:
+        # Number of neighbours on the ring, including the last and the first bit, that agree
+        return (population == np.roll(population, 1, axis=1)).sum(axis=1)
+
+    def _evaluate_one(self, x: list) -> int:
+        return sum(1 for previous, bit in zip(x[-1:] + x[:-1], x) if previous == bit)
+
+
+PROBLEMS = {problem.problem_id: problem for problem in [OneMax, LeadingOnes, IsingRing]}
+
+
+def get_problem(problem_id: int, instance: int, dimension: int) -> PboProblem:
+    if problem_id not in PROBLEMS:
+        raise ValueError(f"There is no native implementation of PBO problem {problem_id}")
+    return PROBLEMS[problem_id](instance, dimension)
@@ -4,3 +4,15 @@ from .base import Tree
 def create(recipe):
     root, _ = Tree.create(recipe)
     return root
+
+
+def compile(root, schema=None):
+    return root.compile(schema)
+
+
+def simplify(root):
+    return root.simplify()
+
+
+def canonicalize(root):
+    return root.canonicalize()
@@ -1,70 +1,160 @@
 import math
+import random
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import Union, Callable
+
+import numpy as np
+
+from feast.tree.opcodes import get_opcode
+
+
+def protected_division(first_operand, second_operand):
+    return first_operand / second_operand if second_operand != 0 else 0
+
+
+def logical_and(first_operand, second_operand):
+    return first_operand and second_operand
+
+
+def logical_or(first_operand, second_operand):
+    return first_operand or second_operand
+
+
+# Names available to the source generated by Tree.compile
+COMPILE_NAMESPACE = {
+    'protected_division': protected_division,
+    'logical_and': logical_and,
+    'logical_or': logical_or,
+    'uniform': random.uniform,
+    'randint': random.randint,
+}
+
+
+# Maps every node type to the Tree subclass implementing it, filled on first use
+NODE_CLASSES = {}
+
+# Maps terminals seen so far to their parsed fields, see Tree.parse_terminal. Constant folding keeps adding new
+# constants, so once it holds MAX_PARSED_TERMINALS, further terminals are parsed for every node instead.
+PARSED_TERMINALS = {}
+MAX_PARSED_TERMINALS = 4096
+
+
+def create_constant(value: Union[bool, float]) -> 'Tree':
+    node_classes = get_node_classes()
+    if isinstance(value, bool):
+        return node_classes['boolean_nullary']('boolean_nullary:' + ('true' if value else 'false'))
+    value = float(value)
+    text = str(int(value)) if value.is_integer() else repr(value)
+    return node_classes['numeric_nullary'](f'numeric_nullary:{text}')
+
+
+def get_node_classes() -> dict:
+    if not NODE_CLASSES:
+        from feast.tree.numeric import NumericNullary, NumericUnary, NumericBinary, NumericTernary
+        from feast.tree.boolean import BooleanNullary, BooleanUnary, BooleanUnaryNum, BooleanBinary, \
+            BooleanBinaryNum, BooleanTernary
+        NODE_CLASSES.update({
+            'numeric_nullary': NumericNullary,
+            'numeric_nullary_observable': NumericNullary,
+            'numeric_nullary_random': NumericNullary,
+            'numeric_unary': NumericUnary,
+            'numeric_binary': NumericBinary,
+            'numeric_ternary': NumericTernary,
+            'boolean_nullary': BooleanNullary,
+            'boolean_nullary_observable': BooleanNullary,
+            'boolean_nullary_random': BooleanNullary,
+            'boolean_unary': BooleanUnary,
+            'boolean_unary_num': BooleanUnaryNum,
+            'boolean_binary': BooleanBinary,
+            'boolean_binary_num': BooleanBinaryNum,
+            'boolean_ternary': BooleanTernary,
+        })
+    return NODE_CLASSES
 
 
 class Tree(ABC):
+    __slots__ = ('terminal', 'node_type', 'value', 'opcode', 'constant', 'key', 'children', '_height')
     indent = ' '
+    arity = 0
 
     def __init__(self, terminal):
+        # Terminals are parsed once, after which all nodes with that terminal share the parsed fields
+        parsed = PARSED_TERMINALS.get(terminal)
+        if parsed is None:
+            parsed = self.parse_terminal(terminal)
+            if len(PARSED_TERMINALS) < MAX_PARSED_TERMINALS:
+                PARSED_TERMINALS[terminal] = parsed
+        self.terminal, self.node_type, self.value, self.opcode, self.constant, self.key = parsed
+        self._height = None
+        self.children = [] if self.arity else ()
+
+    @classmethod
+    def parse_terminal(cls, terminal: str) -> tuple:
+        # Returns terminal, node type, value, opcode, constant (for constant leaves) and key (for observable leaves)
         if ':' not in terminal:
             raise ValueError
-        self.terminal = terminal
-        self._height = None
-        self.children = []
+        node_type, _, value = terminal.partition(':')
+        return terminal, node_type, value, get_opcode(node_type, value), None, None
 
     @staticmethod
     def create(recipe):
+        # Single pass over the recipe: each node is attached to the innermost node still missing children
         if type(recipe) is str:
             recipe = recipe.split('|')
-        ingredient, remaining_ingredients = recipe[0], recipe[1:]
-        node_type, node_value = ingredient.split(':')
-        node = None
-
-        if 'numeric_nullary' in node_type:
-            from feast.tree.numeric import NumericNullary
-            node = NumericNullary(ingredient)
-        if node_type == 'numeric_unary':
-            from feast.tree.numeric import NumericUnary
-            node = NumericUnary(ingredient)
-        if node_type == 'numeric_binary':
-            from feast.tree.numeric import NumericBinary
-            node = NumericBinary(ingredient)
-        if node_type == 'numeric_ternary':
-            from feast.tree.numeric import NumericTernary
-            node = NumericTernary(ingredient)
-
-        if 'boolean_nullary' in node_type:
-            from feast.tree.boolean import BooleanNullary
-            node = BooleanNullary(ingredient)
-        if node_type == 'boolean_unary':
-            from feast.tree.boolean import BooleanUnary
-            node = BooleanUnary(ingredient)
-        if node_type == 'boolean_unary_num':
-            from feast.tree.boolean import BooleanUnaryNum
-            node = BooleanUnaryNum(ingredient)
-        if node_type == 'boolean_binary':
-            from feast.tree.boolean import BooleanBinary
-            node = BooleanBinary(ingredient)
-        if node_type == 'boolean_binary_num':
-            from feast.tree.boolean import BooleanBinaryNum
-            node = BooleanBinaryNum(ingredient)
-        if node_type == 'boolean_ternary':
-            from feast.tree.boolean import BooleanTernary
-            node = BooleanTernary(ingredient)
-
-        if node is None:
-            raise ValueError(f"Cannot create node from ingredient {ingredient}")
-
-        return [node, node._continue_deserialization(remaining_ingredients)]
+        node_classes = get_node_classes()
+        root = None
+        incomplete_nodes = []
+        for position, ingredient in enumerate(recipe):
+            node_type = ingredient.partition(':')[0]
+            if node_type not in node_classes:
+                raise ValueError(f"Cannot create node from ingredient {ingredient}")
+            node = node_classes[node_type](ingredient)
+
+            if incomplete_nodes:
+                parent = incomplete_nodes[-1]
+                parent.children.append(node)
+                if len(parent.children) == parent.arity:
+                    incomplete_nodes.pop()
+            else:
+                root = node
+            if node.arity:
+                incomplete_nodes.append(node)
+
+            if not incomplete_nodes:
+                return [root, recipe[position + 1:]]
+        raise ValueError(f"Recipe ended before the tree was complete: {'|'.join(recipe)}")
 
     def serialize(self):
-        return '|'.join([self.terminal] + [child.serialize() for child in self.children])
+        # Prefix order, walked with an explicit stack so deep trees don't hit the recursion limit
+        terminals = []
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            terminals.append(node.terminal)
+            pending.extend(reversed(node.children))
+        return '|'.join(terminals)
 
     @abstractmethod
     def evaluate(self, observables=None) -> Union[bool, float]:
         pass
 
+    def evaluate_batch(self, observables=None, rng: np.random.Generator = None) -> np.ndarray:
+        # Evaluate over arrays of observables at once; the result has their broadcast shape
+        observables = observables or {}
+        shapes = [np.shape(value) for values in observables.values() for value in values.values()]
+        shape = np.broadcast_shapes(*shapes) if shapes else ()
+        if rng is None:
+            rng = np.random.default_rng()
+        with np.errstate(all='ignore'):
+            result = self._evaluate_batch(observables, shape, rng)
+        if result.shape != shape:
+            result = np.broadcast_to(result, shape).copy()
+        return result
+
+    @abstractmethod
+    def _evaluate_batch(self, observables: dict, shape: tuple, rng: np.random.Generator) -> np.ndarray:
+        pass
+
     @property
     def height(self):
         if len(self.children) == 0:
@@ -73,37 +163,6 @@ class Tree(ABC):
             self._height = max([child.height for child in self.children]) + 1
         return self._height
 
-    @property
-    def value(self):
-        return self.terminal.split(':')[1]
-
-    @property
-    def node_type(self):
-        return self.terminal.split(':')[0]
-
-    def _continue_deserialization(self, recipe):
-        if 'nullary' in self.node_type:
-            return recipe
-        if 'unary' in self.node_type:
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            return recipe
-        if 'binary' in self.node_type:
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            return recipe
-        if 'ternary' in self.node_type:
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            child, recipe = self.create(recipe)
-            self.children.append(child)
-            return recipe
-        raise ValueError(f'Could not determine how to continue deserialization for terminal: {self.terminal}')
-
     def __repr__(self, depth=0):
         this = f"\n{self.indent * depth}{self.terminal}"
         children = "".join([child.__repr__(depth + 1) for child in self.children])
@@ -114,13 +173,129 @@ class Tree(ABC):
     def formula(self) -> str:
         pass
 
+    @property
+    def source(self) -> str:
+        return self.get_source()
+
+    @abstractmethod
+    def get_source(self, schema=None) -> str:
+        # With an observables schema, observables are read by slot from the values of an Observables record
+        pass
+
+    def compile(self, schema=None) -> Callable:
+        # Generate a single Python function for the whole tree, so evaluation doesn't walk the node graph.
+        # Operands are evaluated in the same order as Tree.evaluate, so random nodes draw identically.
+        # Compiled against a schema, the function has to be called with an Observables record of that schema.
+        namespace = dict(COMPILE_NAMESPACE)
+        try:
+            prologue = "" if schema is None else "values = observables.slot_values\n    "
+            source = f"def evaluate(observables=None):\n    {prologue}return {self.get_source(schema)}\n"
+            exec(compile(source, '<feast.tree>', 'exec'), namespace)
+        except (SyntaxError, RecursionError, MemoryError):  # too deeply nested for the Python parser
+            return self.evaluate
+        return namespace['evaluate']
+
     @property
     def is_static(self) -> bool:
-        for child in self.children:
-            if not child.is_static:
+        # Leaves decide for themselves; an operator is static when all its leaves are
+        for leaf in self._leaves():
+            if not leaf.is_static:
                 return False
         return True
 
+    @property
+    def is_random(self) -> bool:
+        for leaf in self._leaves():
+            if leaf.is_random:
+                return True
+        return False
+
+    def _leaves(self):
+        pending = list(self.children)
+        while pending:
+            node = pending.pop()
+            if node.children:
+                pending.extend(node.children)
+            else:
+                yield node
+
+    def _rebuild_bottom_up(self, rebuild_node: Callable) -> 'Tree':
+        # Applies rebuild_node to every operator after its children, without recursion so deep trees don't hit
+        # the recursion limit. Leaves are kept as they are, and an operator is only copied when one of its
+        # children changed.
+        nodes = []
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(reversed(node.children))
+
+        # In reverse prefix order, every operator comes right after its first child, so its rebuilt children are
+        # on top of the stack, first child on top
+        rebuilt = []
+        for node in reversed(nodes):
+            arity = len(node.children)
+            if arity:
+                children = rebuilt[:-arity - 1:-1]
+                del rebuilt[-arity:]
+                for new_child, child in zip(children, node.children):
+                    if new_child is not child:
+                        node = node.with_children(children)
+                        break
+                node = rebuild_node(node)
+            rebuilt.append(node)
+        return rebuilt[0]
+
+    def simplify(self) -> 'Tree':
+        # Returns an equivalent tree with static subtrees folded into constants and identities removed.
+        # Subtrees that don't change are shared with this tree rather than copied.
+        return self._rebuild_bottom_up(lambda node: node._simplify_node())
+
+    def _simplify_node(self) -> 'Tree':
+        if self.arity and self.is_static:
+            return self._fold()
+        return self._simplify_identities()
+
+    def with_children(self, children, terminal: str = None) -> 'Tree':
+        terminal = terminal or self.terminal
+        node = get_node_classes()[terminal.partition(':')[0]](terminal)
+        node.children = list(children)
+        return node
+
+    def canonicalize(self) -> 'Tree':
+        # Simplifies the tree and then puts operands of commutative operators in a fixed order, so equivalent
+        # phenotypes like (a + b) and (b + a) get the same serialization
+        return self.simplify()._order_operands()
+
+    def _order_operands(self) -> 'Tree':
+        return self._rebuild_bottom_up(lambda node: node._canonical_operand_order())
+
+    def _canonical_operand_order(self) -> 'Tree':
+        return self
+
+    def _sorted_operands(self, terminal: str = None) -> 'Tree':
+        first, second = self.children
+        if second.serialize() < first.serialize():
+            return self.with_children([second, first], terminal)
+        if terminal is not None:
+            return self.with_children([first, second], terminal)
+        return self
+
+    def _fold(self) -> 'Tree':
+        # Static children are folded first, so only subtrees that failed to fold make this evaluation deep
+        try:
+            return create_constant(self.evaluate())
+        except (ArithmeticError, RecursionError):
+            return self
+
+    def _simplify_identities(self) -> 'Tree':
+        return self
+
+    def _has_identical_operands(self) -> bool:
+        # Identical random operands still draw separately, so they only count when deterministic
+        first, second = self.children[0], self.children[1]
+        return not first.is_random and first.serialize() == second.serialize()
+
     def collect_index(self, index: str = '0', depth: int = 0, serial_index: int = 0):
         return_serial_index = serial_index != 0  # only the root call should be False
 
@@ -151,3 +326,58 @@ class Tree(ABC):
         if return_serial_index:
             return result, serial_index
         return result
+
+    # Structural editing. Nodes are addressed by paths, tuples of child numbers from the root, and edits return
+    # a new root that shares every subtree off the edited path with this tree, so trees must not be changed
+    # in place once they are built.
+
+    @property
+    def return_type(self) -> str:
+        return self.node_type.split('_')[0]
+
+    def clone(self) -> 'Tree':
+        return self.with_children([child.clone() for child in self.children])
+
+    def subtree(self, path: tuple) -> 'Tree':
+        node = self
+        for child_number in path:
+            node = node.children[child_number]
+        return node
+
+    def replace_subtree(self, path: tuple, replacement: 'Tree') -> 'Tree':
+        # Copies only the ancestors of the replaced node
+        if not path:
+            return replacement
+        child_number = path[0]
+        children = list(self.children)
+        children[child_number] = children[child_number].replace_subtree(path[1:], replacement)
+        return self.with_children(children)
+
+    def replace_terminal(self, path: tuple, terminal: str) -> 'Tree':
+        node = self.subtree(path)
+        if get_node_classes()[terminal.partition(':')[0]].arity != node.arity:
+            raise ValueError(f"Cannot replace {node.terminal} by {terminal} of a different arity")
+        return self.replace_subtree(path, node.with_children(node.children, terminal))
+
+    def nodes_where(self, predicate: Callable) -> list:
+        # Paths and nodes of all nodes that satisfy the predicate, in prefix order
+        result = []
+        pending = [((), self)]
+        while pending:
+            path, node = pending.pop()
+            if predicate(node):
+                result.append((path, node))
+            for child_number in range(len(node.children) - 1, -1, -1):
+                pending.append((path + (child_number,), node.children[child_number]))
+        return result
+
+    def random_node(self, return_type: str = None, predicate: Callable = None,
+                    rng: random.Random = None) -> Union[tuple, None]:
+        # Path and node of a node picked uniformly at random among those of the return type that satisfy the
+        # predicate, or None if there are none
+        candidates = self.nodes_where(
+            lambda node: (return_type is None or node.return_type == return_type)
+            and (predicate is None or predicate(node)))
+        if not candidates:
+            return None
+        return (random if rng is None else rng).choice(candidates)
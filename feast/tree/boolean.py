@@ -1,95 +1,223 @@
+import operator
 import random
-from feast.tree.base import Tree
+
+import numpy as np
+
+from feast.tree.base import Tree, logical_and, logical_or
+from feast.tree.numeric import simplify_if
+from feast.tree.opcodes import (BOOLEAN_CONSTANT, BOOLEAN_OBSERVABLE, BOOLEAN_RANDOM, NOT, AND, OR, GREATER,
+                                GREATER_EQUAL, EQUAL, LESS_EQUAL, LESS, NOT_EQUAL)
 
 
 class BooleanNullary(Tree):
+    __slots__ = ()
+
+    @classmethod
+    def parse_terminal(cls, terminal: str) -> tuple:
+        terminal, node_type, value, opcode, constant, key = super().parse_terminal(terminal)
+        if opcode == BOOLEAN_CONSTANT:
+            constant = value == 'true'
+        if opcode == BOOLEAN_OBSERVABLE:
+            key = value
+        return terminal, node_type, value, opcode, constant, key
+
     def evaluate(self, observables=None) -> bool:
-        if self.node_type == 'boolean_nullary_observable':
-            return observables['boolean'][self.value]
-        if self.terminal == 'boolean_nullary_random:uniform':
-            return random.randint(0, 1) == 1
-        return self.value == 'true'
+        if self.opcode == BOOLEAN_CONSTANT:
+            return self.constant
+        if self.opcode == BOOLEAN_OBSERVABLE:
+            return observables['boolean'][self.key]
+        return random.randint(0, 1) == 1
+
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        if self.opcode == BOOLEAN_CONSTANT:
+            return np.full(shape, self.constant)
+        if self.opcode == BOOLEAN_OBSERVABLE:
+            return np.asarray(observables['boolean'][self.key], dtype=bool)
+        return rng.integers(0, 2, shape) == 1
 
     @property
     def formula(self) -> str:
         return self.value
 
+    def get_source(self, schema=None) -> str:
+        if self.opcode == BOOLEAN_CONSTANT:
+            return repr(self.constant)
+        if self.opcode == BOOLEAN_OBSERVABLE:
+            if schema is not None:
+                return f"values[{schema.slot('boolean', self.key)}]"
+            return f"observables['boolean'][{self.key!r}]"
+        return '(randint(0, 1) == 1)'
+
     @property
     def is_static(self) -> bool:
-        if self.node_type in ['boolean_nullary_observable', 'boolean_nullary_random']:
-            return False
-        return True
+        return self.opcode == BOOLEAN_CONSTANT
+
+    @property
+    def is_random(self) -> bool:
+        return self.opcode == BOOLEAN_RANDOM
 
 
 class BooleanUnary(Tree):
+    __slots__ = ()
+    arity = 1
+
     def evaluate(self, observables=None) -> bool:
-        if self.value == 'not':
-            return not self.children[0].evaluate(observables)
+        return not self.children[0].evaluate(observables)
+
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        return np.logical_not(self.children[0]._evaluate_batch(observables, shape, rng))
 
     @property
     def formula(self) -> str:
         return f'{self.value.upper()}({self.children[0].formula})'
 
+    def get_source(self, schema=None) -> str:
+        return f"(not {self.children[0].get_source(schema)})"
+
+    def _simplify_identities(self) -> Tree:
+        if self.children[0].opcode == NOT:  # NOT(NOT(x)) = x
+            return self.children[0].children[0]
+        return self
+
 
 class BooleanUnaryNum(Tree):
-    def _continue_deserialization(self, recipe):
-        child, recipe = self.create(recipe)
-        self.children.append(child)
-        return recipe
+    __slots__ = ()
+    arity = 1
 
     def evaluate(self, observables=None) -> bool:
-        if self.value == 'truthy':
-            return self.children[0].evaluate(observables) != 0
+        return self.children[0].evaluate(observables) != 0
+
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        return self.children[0]._evaluate_batch(observables, shape, rng) != 0
 
     @property
     def formula(self) -> str:
         return f'{self.value.upper()}({self.children[0].formula})'
 
+    def get_source(self, schema=None) -> str:
+        return f"({self.children[0].get_source(schema)} != 0)"
+
 
 class BooleanBinary(Tree):
+    __slots__ = ()
+    arity = 2
+
+    operators = {
+        AND: logical_and,
+        OR: logical_or,
+    }
+    batch_operators = {
+        AND: np.logical_and,
+        OR: np.logical_or,
+    }
+
     def evaluate(self, observables=None) -> bool:
         first_operand = self.children[0].evaluate(observables)
         second_operand = self.children[1].evaluate(observables)
+        return self.operators[self.opcode](first_operand, second_operand)
 
-        if self.value == 'and':
-            return first_operand and second_operand
-        if self.value == 'or':
-            return first_operand or second_operand
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        first_operand = self.children[0]._evaluate_batch(observables, shape, rng)
+        second_operand = self.children[1]._evaluate_batch(observables, shape, rng)
+        return self.batch_operators[self.opcode](first_operand, second_operand)
 
     @property
     def formula(self) -> str:
         return f"({self.children[0].formula} {self.value.upper()} {self.children[1].formula})"
 
+    def get_source(self, schema=None) -> str:
+        # Both operands are always evaluated, like in evaluate(), so no short-circuiting here
+        first, second = [child.get_source(schema) for child in self.children]
+        return f"logical_{self.value}({first}, {second})"
+
+    def _simplify_identities(self) -> Tree:
+        # A constant operand either decides the outcome (false for AND, true for OR) or drops out
+        deciding_constant = self.opcode == OR
+        for constant, other in [(self.children[0], self.children[1]), (self.children[1], self.children[0])]:
+            if constant.opcode == BOOLEAN_CONSTANT:
+                return constant if constant.constant == deciding_constant else other
+        if self._has_identical_operands():
+            return self.children[0]
+        return self
+
+    def _canonical_operand_order(self) -> Tree:
+        return self._sorted_operands()
+
 
 class BooleanBinaryNum(Tree):
+    __slots__ = ()
+    arity = 2
+
+    operators = {
+        GREATER: operator.gt,
+        GREATER_EQUAL: operator.ge,
+        EQUAL: operator.eq,
+        LESS_EQUAL: operator.le,
+        LESS: operator.lt,
+        NOT_EQUAL: operator.ne,
+    }
+    batch_operators = {
+        GREATER: np.greater,
+        GREATER_EQUAL: np.greater_equal,
+        EQUAL: np.equal,
+        LESS_EQUAL: np.less_equal,
+        LESS: np.less,
+        NOT_EQUAL: np.not_equal,
+    }
+
     def evaluate(self, observables=None) -> bool:
         first_operand = self.children[0].evaluate(observables)
         second_operand = self.children[1].evaluate(observables)
+        return self.operators[self.opcode](first_operand, second_operand)
 
-        if self.value == '>':
-            return first_operand > second_operand
-        if self.value == '>=':
-            return first_operand >= second_operand
-        if self.value == '==':
-            return first_operand == second_operand
-        if self.value == '<=':
-            return first_operand <= second_operand
-        if self.value == '<':
-            return first_operand < second_operand
-        if self.value == '!=':
-            return first_operand != second_operand
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        first_operand = self.children[0]._evaluate_batch(observables, shape, rng)
+        second_operand = self.children[1]._evaluate_batch(observables, shape, rng)
+        return self.batch_operators[self.opcode](first_operand, second_operand)
 
     @property
     def formula(self) -> str:
         return f"({self.children[0].formula} {self.value.upper()} {self.children[1].formula})"
 
+    def get_source(self, schema=None) -> str:
+        first, second = [child.get_source(schema) for child in self.children]
+        return f"({first} {self.value} {second})"
+
+    def _canonical_operand_order(self) -> Tree:
+        if self.opcode in [EQUAL, NOT_EQUAL]:
+            return self._sorted_operands()
+        # a > b is written as b < a, and a >= b as b <= a
+        if self.opcode == GREATER:
+            return self.with_children([self.children[1], self.children[0]], 'boolean_binary_num:<')
+        if self.opcode == GREATER_EQUAL:
+            return self.with_children([self.children[1], self.children[0]], 'boolean_binary_num:<=')
+        return self
+
 
 class BooleanTernary(Tree):
+    __slots__ = ()
+    arity = 3
+
     def evaluate(self, observables=None) -> bool:
         if self.children[0].evaluate(observables):
             return self.children[1].evaluate(observables)
         return self.children[2].evaluate(observables)
 
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        condition = self.children[0]._evaluate_batch(observables, shape, rng)
+        return np.where(
+            condition,
+            self.children[1]._evaluate_batch(observables, shape, rng),
+            self.children[2]._evaluate_batch(observables, shape, rng)
+        )
+
     @property
     def formula(self) -> str:
         return f"IF({self.children[0].formula} ; {self.children[1].formula} ; {self.children[2].formula})"
+
+    def get_source(self, schema=None) -> str:
+        condition, first, second = [child.get_source(schema) for child in self.children]
+        return f"({first} if {condition} else {second})"
+
+    def _simplify_identities(self) -> Tree:
+        return simplify_if(self)
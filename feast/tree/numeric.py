@@ -1,58 +1,133 @@
-from feast.tree.base import Tree
+from feast.tree.base import Tree, protected_division
+from feast.tree.opcodes import (NUMERIC_CONSTANT, NUMERIC_OBSERVABLE, NUMERIC_RANDOM, NEGATIVE, BOOLEAN_CONSTANT, NOT,
+                                ADD, SUBTRACT, MULTIPLY, DIVIDE, MODULO, POWER, MINIMUM, MAXIMUM)
+import math
+import operator
 import random
 
+import numpy as np
+
+
+def protected_division_batch(first_operand, second_operand):
+    result = np.zeros(np.broadcast_shapes(np.shape(first_operand), np.shape(second_operand)))
+    return np.divide(first_operand, second_operand, out=result, where=second_operand != 0)
+
 
 class NumericNullary(Tree):
+    __slots__ = ()
+
+    @classmethod
+    def parse_terminal(cls, terminal: str) -> tuple:
+        terminal, node_type, value, opcode, constant, key = super().parse_terminal(terminal)
+        if opcode == NUMERIC_CONSTANT:
+            constant = float(value)
+        if opcode == NUMERIC_OBSERVABLE:
+            key = value
+        return terminal, node_type, value, opcode, constant, key
+
     def evaluate(self, observables=None) -> float:
-        if self.node_type == 'numeric_nullary_observable':
-            return observables['numeric'][self.value]
-        if self.terminal == 'numeric_nullary_random:uniform':
-            return random.uniform(0, 1)
-        return float(self.value)
+        if self.opcode == NUMERIC_CONSTANT:
+            return self.constant
+        if self.opcode == NUMERIC_OBSERVABLE:
+            return observables['numeric'][self.key]
+        return random.uniform(0, 1)
+
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        if self.opcode == NUMERIC_CONSTANT:
+            return np.full(shape, self.constant)
+        if self.opcode == NUMERIC_OBSERVABLE:
+            return np.asarray(observables['numeric'][self.key], dtype=float)
+        return rng.uniform(0, 1, shape)
 
     @property
     def formula(self) -> str:
         return self.value
 
+    def get_source(self, schema=None) -> str:
+        if self.opcode == NUMERIC_CONSTANT:
+            return repr(self.constant) if math.isfinite(self.constant) else f"float('{self.constant}')"
+        if self.opcode == NUMERIC_OBSERVABLE:
+            if schema is not None:
+                return f"values[{schema.slot('numeric', self.key)}]"
+            return f"observables['numeric'][{self.key!r}]"
+        return 'uniform(0, 1)'
+
     @property
     def is_static(self) -> bool:
-        if self.node_type in ['numeric_observable', 'numeric_random']:
-            return False
-        return True
+        return self.opcode == NUMERIC_CONSTANT
+
+    @property
+    def is_random(self) -> bool:
+        return self.opcode == NUMERIC_RANDOM
+
+
+def is_numeric_constant(node: Tree, value: float) -> bool:
+    return node.opcode == NUMERIC_CONSTANT and node.constant == value
 
 
 class NumericUnary(Tree):
+    __slots__ = ()
+    arity = 1
+
     def evaluate(self, observables=None) -> float:
-        if self.value == 'negative':
-            return -self.children[0].evaluate(observables)
+        return -self.children[0].evaluate(observables)
+
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        return np.negative(self.children[0]._evaluate_batch(observables, shape, rng))
 
     @property
     def formula(self) -> str:
-        if self.value == 'negative':
-            return '-' + self.children[0].formula
+        return '-' + self.children[0].formula
+
+    def get_source(self, schema=None) -> str:
+        return f"(-{self.children[0].get_source(schema)})"
+
+    def _simplify_identities(self) -> Tree:
+        if self.children[0].opcode == NEGATIVE:  # -(-x) = x
+            return self.children[0].children[0]
+        return self
 
 
 class NumericBinary(Tree):
+    __slots__ = ()
+    arity = 2
+
+    operators = {
+        ADD: operator.add,
+        SUBTRACT: operator.sub,
+        MULTIPLY: operator.mul,
+        DIVIDE: protected_division,
+        MODULO: operator.mod,
+        POWER: operator.pow,
+        MINIMUM: min,
+        MAXIMUM: max,
+    }
+    operator_sources = {
+        ADD: '({} + {})',
+        SUBTRACT: '({} - {})',
+        MULTIPLY: '({} * {})',
+        DIVIDE: 'protected_division({}, {})',
+        MODULO: '({} % {})',
+        POWER: '({} ** {})',
+        MINIMUM: 'min({}, {})',
+        MAXIMUM: 'max({}, {})',
+    }
+    batch_operators = {
+        ADD: np.add,
+        SUBTRACT: np.subtract,
+        MULTIPLY: np.multiply,
+        DIVIDE: protected_division_batch,
+        MODULO: np.mod,
+        POWER: np.power,
+        MINIMUM: np.minimum,
+        MAXIMUM: np.maximum,
+    }
+
     def evaluate(self, observables=None) -> float:
         first_operand = self.children[0].evaluate(observables)
         second_operand = self.children[1].evaluate(observables)
         try:
-            if self.value == '+':
-                return first_operand + second_operand
-            if self.value == '-':
-                return first_operand - second_operand
-            if self.value == '*':
-                return first_operand * second_operand
-            if self.value == '/':
-                return first_operand / second_operand if second_operand != 0 else 0  # protected division
-            if self.value == '%':
-                return first_operand % second_operand
-            if self.value == '^':
-                return first_operand ** second_operand
-            if self.value == 'min':
-                return min(first_operand, second_operand)
-            if self.value == 'max':
-                return max(first_operand, second_operand)
+            return self.operators[self.opcode](first_operand, second_operand)
         except ArithmeticError as e:
             print(f"Error in {first_operand} {self.value} {second_operand}")
             print(e)
@@ -62,19 +137,83 @@ class NumericBinary(Tree):
             print(e)
             raise e
 
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        first_operand = self.children[0]._evaluate_batch(observables, shape, rng)
+        second_operand = self.children[1]._evaluate_batch(observables, shape, rng)
+        return self.batch_operators[self.opcode](first_operand, second_operand)
+
     @property
     def formula(self) -> str:
-        if self.value in ['min', 'max']:
+        if self.opcode in [MINIMUM, MAXIMUM]:
             return f"{self.value}({self.children[0].formula}, {self.children[1].formula})"
         return f"({self.children[0].formula} {self.value} {self.children[1].formula})"
 
+    def get_source(self, schema=None) -> str:
+        return self.operator_sources[self.opcode].format(self.children[0].get_source(schema),
+                                                         self.children[1].get_source(schema))
+
+    def _simplify_identities(self) -> Tree:
+        first, second = self.children
+        if self.opcode == ADD:
+            if is_numeric_constant(second, 0):
+                return first
+            if is_numeric_constant(first, 0):
+                return second
+        if self.opcode == SUBTRACT and is_numeric_constant(second, 0):
+            return first
+        if self.opcode == MULTIPLY:
+            if is_numeric_constant(second, 1):
+                return first
+            if is_numeric_constant(first, 1):
+                return second
+        if self.opcode == DIVIDE and is_numeric_constant(second, 1):
+            return first
+        if self.opcode in [MINIMUM, MAXIMUM] and self._has_identical_operands():
+            return first
+        return self
+
+    def _canonical_operand_order(self) -> Tree:
+        if self.opcode in [ADD, MULTIPLY, MINIMUM, MAXIMUM]:
+            return self._sorted_operands()
+        return self
+
 
 class NumericTernary(Tree):
+    __slots__ = ()
+    arity = 3
+
     def evaluate(self, observables=None) -> float:
         if self.children[0].evaluate(observables):
             return self.children[1].evaluate(observables)
         return self.children[2].evaluate(observables)
 
+    def _evaluate_batch(self, observables, shape, rng) -> np.ndarray:
+        condition = self.children[0]._evaluate_batch(observables, shape, rng)
+        return np.where(
+            condition,
+            self.children[1]._evaluate_batch(observables, shape, rng),
+            self.children[2]._evaluate_batch(observables, shape, rng)
+        )
+
     @property
     def formula(self) -> str:
         return f"IF({self.children[0].formula} ; {self.children[1].formula} ; {self.children[2].formula})"
+
+    def get_source(self, schema=None) -> str:
+        condition, first, second = [child.get_source(schema) for child in self.children]
+        return f"({first} if {condition} else {second})"
+
+    def _simplify_identities(self) -> Tree:
+        return simplify_if(self)
+
+
+def simplify_if(node: Tree) -> Tree:
+    # Shared by the numeric and boolean IF nodes
+    condition, if_true, if_false = node.children
+    if condition.opcode == BOOLEAN_CONSTANT:
+        return if_true if condition.constant else if_false
+    if if_true.serialize() == if_false.serialize():
+        return if_true
+    if condition.opcode == NOT:  # IF(NOT(c) ; a ; b) = IF(c ; b ; a)
+        return node.with_children([condition.children[0], if_false, if_true])
+    return node
@@ -0,0 +1,71 @@
+# Integer opcodes for every terminal, parsed once per node so evaluation doesn't compare strings
+NUMERIC_CONSTANT = 0
+NUMERIC_OBSERVABLE = 1
+NUMERIC_RANDOM = 2
+NEGATIVE = 3
+ADD = 4
+SUBTRACT = 5
+MULTIPLY = 6
+DIVIDE = 7
+MODULO = 8
+POWER = 9
+MINIMUM = 10
+MAXIMUM = 11
+NUMERIC_IF = 12
+
+BOOLEAN_CONSTANT = 13
+BOOLEAN_OBSERVABLE = 14
+BOOLEAN_RANDOM = 15
+NOT = 16
+TRUTHY = 17
+AND = 18
+OR = 19
+GREATER = 20
+GREATER_EQUAL = 21
+EQUAL = 22
+LESS_EQUAL = 23
+LESS = 24
+NOT_EQUAL = 25
+BOOLEAN_IF = 26
+
+# Node types whose value is data (a constant or an observable name) rather than an operator
+VALUE_OPCODES = {
+    'numeric_nullary': NUMERIC_CONSTANT,
+    'numeric_nullary_observable': NUMERIC_OBSERVABLE,
+    'boolean_nullary': BOOLEAN_CONSTANT,
+    'boolean_nullary_observable': BOOLEAN_OBSERVABLE,
+}
+
+OPERATOR_OPCODES = {
+    ('numeric_nullary_random', 'uniform'): NUMERIC_RANDOM,
+    ('numeric_unary', 'negative'): NEGATIVE,
+    ('numeric_binary', '+'): ADD,
+    ('numeric_binary', '-'): SUBTRACT,
+    ('numeric_binary', '*'): MULTIPLY,
+    ('numeric_binary', '/'): DIVIDE,
+    ('numeric_binary', '%'): MODULO,
+    ('numeric_binary', '^'): POWER,
+    ('numeric_binary', 'min'): MINIMUM,
+    ('numeric_binary', 'max'): MAXIMUM,
+    ('numeric_ternary', 'if'): NUMERIC_IF,
+    ('boolean_nullary_random', 'uniform'): BOOLEAN_RANDOM,
+    ('boolean_unary', 'not'): NOT,
+    ('boolean_unary_num', 'truthy'): TRUTHY,
+    ('boolean_binary', 'and'): AND,
+    ('boolean_binary', 'or'): OR,
+    ('boolean_binary_num', '>'): GREATER,
+    ('boolean_binary_num', '>='): GREATER_EQUAL,
+    ('boolean_binary_num', '=='): EQUAL,
+    ('boolean_binary_num', '<='): LESS_EQUAL,
+    ('boolean_binary_num', '<'): LESS,
+    ('boolean_binary_num', '!='): NOT_EQUAL,
+    ('boolean_ternary', 'if'): BOOLEAN_IF,
+}
+
+
+def get_opcode(node_type: str, value: str) -> int:
+    if node_type in VALUE_OPCODES:
+        return VALUE_OPCODES[node_type]
+    if (node_type, value) in OPERATOR_OPCODES:
+        return OPERATOR_OPCODES[(node_type, value)]
+    raise ValueError(f"Unknown terminal {node_type}:{value}")
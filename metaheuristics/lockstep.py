@@ -0,0 +1,102 @@
+from typing import Dict, Callable
+
+from ioh import ProblemType
+
+from .base import Heuristic
+from .tworate import TwoRateEa
+import random
+import math
+
+import numpy as np
+
+
+class LockstepTwoRateEa(Heuristic):
+    # Runs of TwoRateEa advanced together: row i of every array is run i. Each epoch, the adaptation formula is
+    # evaluated once for all runs with array observables, of the schema of TwoRateEa, so it has to work like
+    # Tree.evaluate_batch.
+    # Runs stop on their own budget or on reaching the optimum, after which their rows are left as they are.
+    # Runs share one problem, so a logger attached to it sees their evaluations interleaved.
+    def __init__(self, child_pop_size: int, runs: int):
+        super().__init__()
+        self.child_pop_size = child_pop_size
+        self.runs = runs
+        self.rate = None
+        self.adapt_rate = None
+        self.evaluations = None
+        self.rng = None
+        self.observables = None
+
+    def configure(self, problem: ProblemType, budget: int, injections: Dict[str, Callable]):
+        self.problem: ProblemType = problem
+        self.dimension = self.problem.meta_data.n_variables
+        self.budget = budget
+        self.adapt_rate = injections['adaptation']
+        self.observables = TwoRateEa.observables_schema.record()
+        self.observables.set('numeric', 'dimension', self.dimension)
+
+    def initialize_population(self):
+        # Seeded from random, so seeding random still makes runs reproducible
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        self.best = self.rng.integers(0, 2, (self.runs, self.dimension), dtype=np.uint8)
+        self.f_best = self.evaluate(self.best)
+        self.evaluations = np.ones(self.runs, dtype=int)
+        self.rate = np.full(self.runs, 2.0)
+
+    def evaluate(self, population: np.ndarray) -> np.ndarray:
+        # Problems from feast.problems evaluate the whole population at once, ioh problems one by one
+        if hasattr(self.problem, 'evaluate_batch'):
+            return self.problem.evaluate_batch(population)
+        return np.array([self.problem(x) for x in population], dtype=float)
+
+    def mutation(self, probability_per_bit: np.ndarray) -> np.ndarray:
+        # Children of the best of each run, with a probability per child, redrawing flip masks without any flips
+        shape = probability_per_bit.shape + (self.dimension,)
+        flips = self.rng.random(shape) <= probability_per_bit[..., np.newaxis]
+        redraw = ~flips.any(axis=-1)
+        while redraw.any():
+            redrawn = self.rng.random((int(redraw.sum()), self.dimension))
+            flips[redraw] = redrawn <= probability_per_bit[redraw, np.newaxis]
+            redraw = ~flips.any(axis=-1)
+        return self.best[:, np.newaxis, :] ^ flips.astype(np.uint8)
+
+    def run(self):
+        optimum = int(self.problem.optimum.y)
+        low_children = math.ceil(self.child_pop_size / 2)
+        slots = np.arange(self.child_pop_size)
+        is_low = slots < low_children
+        min_rate, max_rate = TwoRateEa.rate_bounds(self.dimension)
+        values = self.observables.slot_values
+        rate_slot = TwoRateEa.observables_schema.slot('numeric', 'rate')
+        best_child_is_low_slot = TwoRateEa.observables_schema.slot('boolean', 'best_child_is_low')
+
+        active = (self.evaluations < self.budget) & (self.f_best < optimum)
+        while active.any():
+            # Near the end of its budget a run gets fewer children, split between the rates like in TwoRateEa
+            child_population_size = np.minimum(self.child_pop_size, self.budget - self.evaluations)
+            child_population_size[~active] = 0
+            used_low = np.ceil(child_population_size / 2)[:, np.newaxis]
+            used_high = np.floor(child_population_size / 2)[:, np.newaxis]
+            used = np.where(is_low, slots < used_low, slots - low_children < used_high)
+
+            probability = np.where(is_low, self.rate[:, np.newaxis] / (2 * self.dimension),
+                                   2 * self.rate[:, np.newaxis] / self.dimension)
+            children = self.mutation(probability)
+            fitness = np.full(used.shape, -np.inf)
+            fitness[used] = self.evaluate(children[used])
+            self.evaluations += child_population_size
+
+            # Like the serial loop, ties go to the child evaluated last
+            best_slot = self.child_pop_size - 1 - np.argmax(fitness[:, ::-1], axis=1)
+            f_current_best = fitness[np.arange(self.runs), best_slot]
+            improved = active & (f_current_best > self.f_best)
+            self.best[improved] = children[improved, best_slot[improved]]
+            self.f_best[improved] = f_current_best[improved]
+
+            values[rate_slot] = self.rate
+            values[best_child_is_low_slot] = is_low[best_slot]
+            rate = np.asarray(self.adapt_rate(self.observables, self.rng), dtype=float)
+            rate = np.where(np.isfinite(rate), np.clip(rate, min_rate, max_rate), self.rate)
+            self.rate = np.where(active, rate, self.rate)
+
+            active = (self.evaluations < self.budget) & (self.f_best < optimum)
+        return [self.f_best.astype(int), self.best, self.evaluations]
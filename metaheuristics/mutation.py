@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def sample_flip_count(rng: np.random.Generator, dimension: int, probability_per_bit: float) -> int:
+    # Number of flips of standard bit mutation, conditioned on flipping at least one bit
+    if probability_per_bit >= 1:
+        return dimension
+    if probability_per_bit <= 0:
+        return 1  # the limit of the conditional distribution
+    probability_of_none = (1 - probability_per_bit) ** dimension
+    if probability_of_none < 0.5:
+        # Rejection needs fewer than two draws on average
+        while True:
+            flips = int(rng.binomial(dimension, probability_per_bit))
+            if flips > 0:
+                return flips
+
+    # Inverse CDF, starting past the mass of zero flips. Most of the mass is on small counts here.
+    target = probability_of_none + rng.random() * (1 - probability_of_none)
+    odds = probability_per_bit / (1 - probability_per_bit)
+    flips = 0
+    probability = probability_of_none
+    cumulative = probability_of_none
+    while cumulative < target and flips < dimension:
+        probability *= (dimension - flips) / (flips + 1) * odds
+        flips += 1
+        cumulative += probability
+    return max(flips, 1)
+
+
+def mutate(rng: np.random.Generator, parent: np.ndarray, probability_per_bit: float) -> np.ndarray:
+    # Flips each bit of a uint8 array with the given probability, redrawn until at least one bit flips
+    child = parent.copy()
+    flips = sample_flip_count(rng, parent.size, probability_per_bit)
+    if flips == 1:
+        child[int(rng.random() * parent.size)] ^= 1
+    else:
+        child[sample_positions(rng, parent.size, flips)] ^= 1
+    return child
+
+
+def sample_positions(rng: np.random.Generator, dimension: int, count: int) -> np.ndarray:
+    # Distinct positions, uniformly at random. Redrawing on collisions is much cheaper than rng.choice as long
+    # as collisions are rare, which is the case for the usual handful of flips.
+    if count * count > dimension:
+        return rng.choice(dimension, count, replace=False)
+    while True:
+        positions = (rng.random(count) * dimension).astype(np.intp)
+        if len(set(positions.tolist())) == count:
+            return positions
@@ -0,0 +1,63 @@
+from collections.abc import Mapping
+from typing import NamedTuple, Tuple
+
+
+class ObservablesSchema(NamedTuple):
+    # The observables an inner heuristic exposes to its injected formulas. Every observable gets a fixed slot,
+    # numeric ones first, so formulas compiled against the schema can read them by index.
+    numeric: Tuple[str, ...] = ()
+    boolean: Tuple[str, ...] = ()
+
+    def slot(self, kind: str, name: str) -> int:
+        if kind == 'numeric' and name in self.numeric:
+            return self.numeric.index(name)
+        if kind == 'boolean' and name in self.boolean:
+            return len(self.numeric) + self.boolean.index(name)
+        raise ValueError(f"There is no {kind} observable {name} in {self}")
+
+    def record(self) -> 'Observables':
+        return Observables(self)
+
+
+class Observables(Mapping):
+    # Values of all observables of a schema in one list, updated in place by the heuristic. Formulas compiled
+    # against the schema read the list directly; everything else can still use observables['numeric']['rate'].
+    __slots__ = ('schema', 'slot_values', '_kinds')
+
+    def __init__(self, schema: ObservablesSchema):
+        self.schema = schema
+        self.slot_values = [None] * (len(schema.numeric) + len(schema.boolean))
+        self._kinds = {
+            'numeric': ObservablesView(self, 'numeric', schema.numeric),
+            'boolean': ObservablesView(self, 'boolean', schema.boolean),
+        }
+
+    def __getitem__(self, kind: str) -> 'ObservablesView':
+        return self._kinds[kind]
+
+    def __iter__(self):
+        return iter(self._kinds)
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def set(self, kind: str, name: str, value) -> None:
+        self.slot_values[self.schema.slot(kind, name)] = value
+
+
+class ObservablesView(Mapping):
+    # The observables of one kind, by name
+    __slots__ = ('record', 'slots')
+
+    def __init__(self, record: Observables, kind: str, names: Tuple[str, ...]):
+        self.record = record
+        self.slots = {name: record.schema.slot(kind, name) for name in names}
+
+    def __getitem__(self, name: str):
+        return self.record.slot_values[self.slots[name]]
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self) -> int:
+        return len(self.slots)
@@ -3,37 +3,78 @@ from typing import Dict, Callable
 from ioh import ProblemType
 
 from .base import Heuristic
+from .mutation import mutate
+from .observables import ObservablesSchema
 import random
 import math
 
+import numpy as np
+
 
 class TwoRateEa(Heuristic):
-    def __init__(self, child_pop_size: int):
+    # The adaptation formula gets an Observables record of this schema, updated in place every epoch, so it
+    # can be compiled against the schema
+    observables_schema = ObservablesSchema(numeric=('rate', 'dimension'), boolean=('best_child_is_low',))
+
+    def __init__(self, child_pop_size: int, mutation_kernel: str = 'python'):
         super().__init__()
         self.rate = 2
         self.adapt_rate = None
         self.child_pop_size = child_pop_size
         self.child_pop = []
+        if mutation_kernel not in ['python', 'numpy']:
+            raise ValueError(f"Invalid mutation kernel: {mutation_kernel}")
+        self.mutation_kernel = mutation_kernel
+        self.rng = None
+        self.observables = None
 
     def configure(self, problem: ProblemType, budget: int, injections: Dict[str, Callable]):
         self.problem: ProblemType = problem
         self.dimension = self.problem.meta_data.n_variables
         self.budget = budget
         self.adapt_rate = injections['adaptation']
+        self.observables = self.observables_schema.record()
+        self.observables.set('numeric', 'dimension', self.dimension)
 
     def initialize_population(self):
         # generate one individual
         self.best = [random.randint(0, 1) for i in range(self.dimension)]
+        if self.mutation_kernel == 'numpy':
+            # Seeded from random, so seeding random still makes runs reproducible
+            self.rng = np.random.default_rng(random.getrandbits(64))
+            self.best = np.array(self.best, dtype=np.uint8)
         self.f_best = self.problem(self.best)
 
     def mutation(self, probability_per_bit):
+        if self.mutation_kernel == 'numpy':
+            return mutate(self.rng, self.best, probability_per_bit)
         # Generate a vector of flips with at least one flip
         mutations = []
         while sum(mutations) < 1:
             mutations = [int(random.random() <= probability_per_bit) for i in range(self.dimension)]
         return [abs(x - y) for x, y in zip(self.best, mutations)]
 
+    @staticmethod
+    def rate_bounds(dimension: int):
+        # As in the original two-rate EA, so the mutation probabilities stay between 1/n and 1/2
+        return 2, max(2, dimension / 4)
+
+    @classmethod
+    def bound_rate(cls, rate, current_rate: float, dimension: int) -> float:
+        # The adaptation formula proposes the next rate; unusable proposals keep the current one
+        try:
+            rate = float(rate)
+        except (TypeError, OverflowError):
+            return current_rate
+        if not math.isfinite(rate):
+            return current_rate
+        min_rate, max_rate = cls.rate_bounds(dimension)
+        return min(max(rate, min_rate), max_rate)
+
     def run(self):
+        values = self.observables.slot_values
+        rate_slot = self.observables_schema.slot('numeric', 'rate')
+        best_child_is_low_slot = self.observables_schema.slot('boolean', 'best_child_is_low')
         epoch = 0
         while self.problem.state.evaluations < self.budget and self.f_best < int(self.problem.optimum.y):
             epoch += 1
@@ -64,8 +105,8 @@ class TwoRateEa(Heuristic):
                 self.best = current_best
                 self.f_best = f_current_best
 
-            self.adapt_rate({
-                'boolean': {'best_child_is_low': best_child_is_low},
-                'numeric': {'rate': self.rate, 'dimension': self.dimension}
-            })
-        return [int(self.f_best), self.best, self.problem]
+            values[rate_slot] = self.rate
+            values[best_child_is_low_slot] = best_child_is_low
+            self.rate = self.bound_rate(self.adapt_rate(self.observables), self.rate, self.dimension)
+        best = self.best.tolist() if self.mutation_kernel == 'numpy' else self.best
+        return [int(self.f_best), best, self.problem]